@@ -0,0 +1,3 @@
+"""
+Benchmarks for the Iris Predictor app. Run with `python -m benchmarks.run`.
+"""
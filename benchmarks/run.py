@@ -0,0 +1,330 @@
+"""
+Benchmark suite: drives every route through Flask's test client (and optionally a local
+gunicorn), microbenchmarks the classifier core, and compares the results to a baseline.
+
+Usage:
+    python -m benchmarks.run                          # test client + microbenchmarks
+    python -m benchmarks.run --gunicorn               # also run the routes against gunicorn
+    python -m benchmarks.run --save-baseline          # store results as the new baseline
+    python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.2
+
+Exits with status 1 if any benchmark regressed beyond the tolerance.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+DEFAULT_OUTPUT = os.path.join(HERE, 'results', 'latest.json')
+
+FORM = {'sl': '5.1', 'sw': '3.5', 'pl': '1.4', 'pw': '0.2'}
+
+# name -> (method, path, form data, json body)
+ROUTES = [
+    ('index_get', 'GET', '/', None, None),
+    ('index_post', 'POST', '/', FORM, None),
+    ('export', 'GET', '/export', None, None),
+    ('ask', 'POST', '/ask', None, {'question': 'How do setosa and virginica differ?'}),
+    ('ask_uncached', 'POST', '/ask', None, None),  # a new question every time
+    ('api_status', 'GET', '/api-status', None, None),
+    ('health', 'GET', '/health', None, None),
+]
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'count': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 4),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 4),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 4),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def peak_rss_mb(pid=None):
+    """Peak resident set size in MB, for this process or another pid on Linux"""
+    if pid is None:
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(kb / 1024.0 if sys.platform != 'darwin' else kb / 1024.0 / 1024.0, 1)
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    return None
+
+
+def timed(fn, iterations, warmup=5):
+    for i in range(warmup):
+        fn(i)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        t = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+# Microbenchmarks
+
+def bench_core(iterations):
+    import numpy as np
+    from benchmarks.stub_app import app_render
+    from iris_core.classifier import get_engine, rows_to_array
+
+    calculate_confidence = app_render.calculate_confidence
+
+    engine = get_engine()
+    rng = np.random.default_rng(0)
+    X = rng.uniform([4, 2, 1, 0.1], [8, 4.5, 7, 2.5], size=(10000, 4))
+    rows = X.tolist()
+    measurements = {'sl': 5.1, 'sw': 3.5, 'pl': 4.4, 'pw': 1.2}
+
+    results = {
+        'classify_scalar': timed(lambda i: engine.predict(5.1, 3.5, 1.4 + (i % 60) / 10.0, 0.2), iterations),
+        'calculate_confidence': timed(lambda i: calculate_confidence(measurements), iterations),
+        'classify_batch_10k': timed(lambda i: engine.predict_array(X), max(10, iterations // 100)),
+        'parse_rows_10k': timed(lambda i: rows_to_array(rows), max(10, iterations // 100)),
+    }
+    results['classify_batch_10k']['rows_per_s'] = round(10000 / (results['classify_batch_10k']['p50_ms'] / 1000.0))
+    return results
+
+
+# Routes through the Flask test client
+
+def bench_test_client(iterations):
+    from benchmarks.stub_app import app
+
+    client = app.test_client()
+    # Give /export something to export
+    for _ in range(200):
+        client.post('/', data=FORM)
+
+    results = {}
+    for name, method, path, form, body in ROUTES:
+        def call(i, method=method, path=path, form=form, body=body, name=name):
+            if name == 'ask_uncached':
+                body = {'question': f'benchmark question {time.perf_counter_ns()}'}
+            response = client.open(path, method=method, data=form, json=body)
+            response.get_data()
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name}: HTTP {response.status_code}")
+        n = iterations if not name.startswith('ask_uncached') else max(10, iterations // 10)
+        results[name] = timed(call, n)
+    return results
+
+
+# Routes through a local gunicorn
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/health')
+            conn.getresponse().read()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def _load(port, method, path, form, body, name, requests_per_thread, concurrency):
+    from urllib.parse import urlencode
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        for _ in range(requests_per_thread):
+            payload = body
+            if name == 'ask_uncached':
+                payload = {'question': f'benchmark question {time.perf_counter_ns()}'}
+            headers = {}
+            data = None
+            if form is not None:
+                data = urlencode(form)
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            elif payload is not None:
+                data = json.dumps(payload)
+                headers['Content-Type'] = 'application/json'
+            t = time.perf_counter()
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    raise RuntimeError(response.status)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            local.append(time.perf_counter() - t)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    result = summarize(latencies, time.perf_counter() - start) if latencies else {'count': 0}
+    result['errors'] = errors[0]
+    result['concurrency'] = concurrency
+    return result
+
+
+def bench_gunicorn(iterations, concurrency, tmpdir):
+    port = _free_port()
+    env = dict(os.environ, BENCH_TMPDIR=tmpdir, PYTHONPATH=ROOT)
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'benchmarks.stub_app:application', '-b', f'127.0.0.1:{port}'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not _wait_for(port):
+            raise RuntimeError("gunicorn did not start")
+        per_thread = max(1, iterations // concurrency)
+        results = {}
+        for name, method, path, form, body in ROUTES:
+            n = per_thread if name != 'ask_uncached' else max(1, per_thread // 10)
+            results[name] = _load(port, method, path, form, body, name, n, concurrency)
+
+        # Peak RSS across the master and its workers
+        worker_pids = subprocess.run(['pgrep', '-P', str(proc.pid)], capture_output=True, text=True).stdout.split()
+        rss = [peak_rss_mb(int(pid)) for pid in [proc.pid] + worker_pids]
+        results['peak_rss_mb'] = {'master': rss[0], 'workers': rss[1:]}
+        return results
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+# Baseline comparison
+
+def compare(results, baseline, tolerance):
+    """Return a list of human-readable regressions"""
+    regressions = []
+    for section, benches in results.items():
+        if not isinstance(benches, dict):
+            continue
+        for name, current in benches.items():
+            previous = baseline.get(section, {}).get(name)
+            if not isinstance(current, dict) or not isinstance(previous, dict):
+                continue
+            for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+                if current.get(key) and previous.get(key) and current[key] > previous[key] * (1 + tolerance):
+                    regressions.append(f"{section}.{name}.{key}: {previous[key]} -> {current[key]}")
+            if current.get('rps') and previous.get('rps') and current['rps'] < previous['rps'] * (1 - tolerance):
+                regressions.append(f"{section}.{name}.rps: {previous['rps']} -> {current['rps']}")
+    return regressions
+
+
+def print_table(results):
+    for section in ('core', 'test_client', 'gunicorn'):
+        benches = results.get(section)
+        if not benches:
+            continue
+        print(f"\n{section}")
+        print(f"  {'benchmark':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>12}")
+        for name, r in benches.items():
+            if isinstance(r, dict) and 'p50_ms' in r:
+                print(f"  {name:<24}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['rps'] or 0:>12.1f}")
+    print(f"\npeak RSS (benchmark process): {results['peak_rss_mb']} MB")
+    if results.get('gunicorn', {}).get('peak_rss_mb'):
+        print(f"peak RSS (gunicorn): {results['gunicorn']['peak_rss_mb']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Iris Predictor benchmarks")
+    parser.add_argument('--iterations', type=int, default=500, help="requests per route / calls per microbenchmark")
+    parser.add_argument('--gunicorn', action='store_true', help="also benchmark the routes against a local gunicorn")
+    parser.add_argument('--concurrency', type=int, default=8, help="client threads for the gunicorn run")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="where to write the JSON results")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="write these results to the baseline file")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown before flagging a regression")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    tmpdir = tempfile.mkdtemp(prefix='iris-bench-')
+    os.environ['BENCH_TMPDIR'] = tmpdir
+
+    results = {
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'iterations': args.iterations,
+    }
+    results['core'] = bench_core(args.iterations * 10)
+    results['test_client'] = bench_test_client(args.iterations)
+    if args.gunicorn:
+        results['gunicorn'] = bench_gunicorn(args.iterations, args.concurrency, tmpdir)
+    results['peak_rss_mb'] = peak_rss_mb()
+
+    print_table(results)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against (run with --save-baseline to create one)")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
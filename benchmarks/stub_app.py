@@ -0,0 +1,45 @@
+"""
+The app with Gemini replaced by a local stub, for benchmarking without network access.
+Used directly by benchmarks/run.py and as a gunicorn target: `gunicorn benchmarks.stub_app:application`.
+"""
+
+import os
+import time
+
+# Keep benchmark runs away from the real databases and the daily limit
+os.environ.setdefault('GEMINI_STARTUP_PROBE', 'off')
+os.environ.setdefault('API_RATE_LIMIT', '1000000000')
+os.environ.setdefault('HISTORY_DB_PATH', os.path.join(os.environ.get('BENCH_TMPDIR', '.'), 'bench_history.db'))
+os.environ.setdefault('RATE_LIMIT_DB_PATH', os.path.join(os.environ.get('BENCH_TMPDIR', '.'), 'bench_rate_limits.db'))
+
+import app_render
+
+# Simulated Gemini latency in seconds
+STUB_LATENCY = float(os.environ.get('BENCH_STUB_LATENCY', 0.05))
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubGenerativeModel:
+    """Stands in for genai.GenerativeModel with a fixed delay and canned text"""
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        text = "Iris setosa has short petals and a compact structure. " * 8
+        if stream:
+            def chunks():
+                for part in text.split('. '):
+                    time.sleep(STUB_LATENCY / 8)
+                    yield StubResponse(part + '. ')
+            return chunks()
+        time.sleep(STUB_LATENCY)
+        return StubResponse(text)
+
+
+app_render.model._model = StubGenerativeModel()
+app_render.model.status = 'ready'
+
+app = app_render.app
+application = app
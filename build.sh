@@ -7,6 +7,12 @@ pip install -r requirements.txt
 # Explicitly install gunicorn
 pip install gunicorn==21.2.0
 
+# Vendor, fingerprint and precompress static assets (pages fall back to CDNs without this)
+python build_assets.py || echo "Asset build failed - serving unbuilt assets"
+
+# Train the classifier on data/iris.csv (without a model the built-in petal length rule is used)
+python train_model.py || echo "Model training failed - using the built-in threshold rule"
+
 # Print installed packages for debugging
 pip list
 
@@ -0,0 +1,28 @@
+"""
+Build fingerprinted, precompressed static assets into static/dist (see iris_core/assets.py).
+Run at deploy time; without a build the pages load Bootstrap and marked from their CDNs.
+
+Usage:
+    python build_assets.py
+    python build_assets.py --no-vendor    # don't download the CDN assets
+"""
+
+import argparse
+
+from iris_core import assets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build fingerprinted static assets")
+    parser.add_argument('--no-vendor', action='store_true', help="don't download third-party CSS/JS")
+    args = parser.parse_args(argv)
+
+    manifest = assets.build(vendor=not args.no_vendor)
+    for name, entry in sorted(manifest.items()):
+        encodings = entry['encodings']
+        print(f"{name} -> {entry['file']}" + (f" ({', '.join(encodings)})" if encodings else ""))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
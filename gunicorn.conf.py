@@ -0,0 +1,22 @@
+# Gunicorn settings, picked up automatically by `gunicorn app:application`.
+# Threaded workers let classifier requests keep being served while a worker
+# has /ask requests waiting on Gemini (see iris_core/llm.py).
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# Workers write metric snapshots here so /metrics can aggregate across all of them
+os.environ.setdefault('METRICS_DIR', '/tmp/iris_metrics')
+# ...and share profiler settings and samples here (see iris_core/profiling.py)
+os.environ.setdefault('PROFILE_DIR', '/tmp/iris_profile')
+
+
+def on_starting(server):
+    from iris_core.metrics import clear_dir
+    clear_dir(os.environ['METRICS_DIR'])
+    from iris_core import profiling
+    profiling.clear_dir(os.environ['PROFILE_DIR'])
@@ -0,0 +1,3 @@
+"""
+Shared core for the Iris Predictor app (classification and supporting helpers).
+"""
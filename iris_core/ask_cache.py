@@ -0,0 +1,138 @@
+"""
+Answer cache for /ask.
+Questions are normalized so trivially different phrasings share an entry. Entries live in a
+bounded in-memory LRU with a TTL, optionally backed by a SQLite file so warm answers survive
+restarts and are shared between gunicorn workers.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+ASK_CACHE_SIZE = int(os.environ.get('ASK_CACHE_SIZE', 512))
+ASK_CACHE_TTL = int(os.environ.get('ASK_CACHE_TTL', 7 * 86400))  # seconds
+
+# Words that don't change what is being asked
+_FILLER_WORDS = {
+    'a', 'an', 'the', 'please', 'pls', 'can', 'could', 'would', 'you', 'tell', 'me',
+    'explain', 'describe', 'i', 'want', 'to', 'know', 'hi', 'hello', 'hey', 'thanks',
+}
+_NON_WORD = re.compile(r'[^\w\s]+')
+
+
+def normalize_question(question):
+    """Reduce a question to a canonical form: case, accents, punctuation and filler words removed"""
+    text = unicodedata.normalize('NFKD', question).encode('ascii', 'ignore').decode('ascii')
+    text = _NON_WORD.sub(' ', text.lower())
+    words = [w for w in text.split() if w not in _FILLER_WORDS]
+    return ' '.join(words)
+
+
+def cache_key(question, namespace=''):
+    """Key for a question; namespace should change whenever the prompt or model changes"""
+    return hashlib.sha256((namespace + '\0' + normalize_question(question)).encode('utf-8')).hexdigest()
+
+
+class AnswerCache:
+    """Bounded LRU of answers with a TTL and an optional on-disk tier"""
+
+    def __init__(self, max_entries=ASK_CACHE_SIZE, ttl=ASK_CACHE_TTL, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._entries = OrderedDict()  # key -> (answer, expires_at), least recently used first
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if path:
+            conn = self._conn()
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS ask_cache (
+                        key TEXT PRIMARY KEY,
+                        answer TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )""")
+                conn.execute("DELETE FROM ask_cache WHERE expires_at <= ?", (time.time(),))
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key, answer, expires_at):
+        # Caller holds the lock
+        self._entries[key] = (answer, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached answer for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+
+        if self.path:
+            try:
+                row = self._conn().execute(
+                    "SELECT answer, expires_at FROM ask_cache WHERE key = ? AND expires_at > ?",
+                    (key, now)).fetchone()
+            except sqlite3.Error as e:
+                print(f"Answer cache read failed: {str(e)}")
+                row = None
+            if row:
+                with self._lock:
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                return row[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, answer):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, answer, expires_at)
+        if self.path:
+            try:
+                conn = self._conn()
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO ask_cache (key, answer, expires_at) VALUES (?, ?, ?)",
+                        (key, answer, expires_at))
+                    self._writes += 1
+                    if self._writes % 100 == 0:
+                        conn.execute("DELETE FROM ask_cache WHERE expires_at <= ?", (time.time(),))
+            except sqlite3.Error as e:
+                print(f"Answer cache write failed: {str(e)}")
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def create_answer_cache():
+    """Build the cache configured by ASK_CACHE_SIZE, ASK_CACHE_TTL and ASK_CACHE_PATH"""
+    path = os.environ.get('ASK_CACHE_PATH') or None
+    try:
+        return AnswerCache(path=path)
+    except sqlite3.Error as e:
+        print(f"Could not open answer cache {path}: {str(e)} - using memory only")
+        return AnswerCache()
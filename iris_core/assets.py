@@ -0,0 +1,237 @@
+"""
+Static asset pipeline.
+
+build() (run by build_assets.py at deploy time) vendors the third-party CSS/JS the templates
+used to load from CDNs, copies everything to static/dist under content-hashed names,
+precompresses text assets (gzip, and brotli when the brotli module is installed) and writes a
+manifest.
+
+At runtime AssetManifest maps logical names to those files for the templates, falling back
+to the CDN or the plain static file when there is no build, and AssetMiddleware serves
+/assets/ with immutable cache headers and the best precompressed encoding the client accepts.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import urllib.request
+
+from markupsafe import Markup, escape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(ROOT, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_NAME = 'manifest.json'
+URL_PREFIX = '/assets/'
+
+# Third-party assets: logical name -> (CDN URL, Subresource Integrity hash or None)
+VENDOR = {
+    'vendor/bootstrap.min.css': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css',
+        'sha384-T3c6CoIi6uLrA9TneNEoa7RxnatzjcDSCmG1MXxSR1GAsXEV/Dwwykc2MPK8M2HN'),
+    'vendor/bootstrap.bundle.min.js': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js',
+        'sha384-C6RzsynM9kWDrMNeT87bh95OGNyZPhcTNXj1NW7RuBCsyN/o0jlpcV8Qyq46cDfL'),
+    'vendor/marked.min.js': ('https://cdn.jsdelivr.net/npm/marked@12.0.2/marked.min.js', None),
+}
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+# Don't bother keeping compressed copies that save less than this
+MIN_SAVING = 0.1
+
+ONE_YEAR = 365 * 86400
+
+
+def _integrity(data):
+    return 'sha384-' + base64.b64encode(hashlib.sha384(data).digest()).decode('ascii')
+
+
+def _fingerprinted(name, data):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _precompress(path, data):
+    """Write .gz (and .br) siblings of path; returns the encodings written"""
+    encodings = []
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) <= len(data) * (1 - MIN_SAVING):
+        _write(path + '.gz', compressed)
+        encodings.append('gzip')
+    try:
+        import brotli
+    except ImportError:
+        return encodings
+    compressed = brotli.compress(data, quality=11)
+    if len(compressed) <= len(data) * (1 - MIN_SAVING):
+        _write(path + '.br', compressed)
+        encodings.insert(0, 'br')
+    return encodings
+
+
+def fetch_vendor(static_dir=STATIC_DIR, timeout=30):
+    """Download VENDOR assets into static/vendor, checking their integrity hashes.
+    Returns the names that are available locally afterwards."""
+    available = []
+    for name, (url, integrity) in VENDOR.items():
+        path = os.path.join(static_dir, name)
+        if not os.path.exists(path):
+            try:
+                with urllib.request.urlopen(url, timeout=timeout) as response:
+                    data = response.read()
+            except OSError as e:
+                print(f"Could not download {url}: {str(e)} - pages will load it from the CDN")
+                continue
+            if integrity and _integrity(data) != integrity:
+                print(f"Integrity check failed for {url} - pages will load it from the CDN")
+                continue
+            _write(path, data)
+        available.append(name)
+    return available
+
+
+def build(static_dir=STATIC_DIR, out_dir=DIST_DIR, vendor=True):
+    """Fingerprint and precompress everything under static_dir into out_dir"""
+    if vendor:
+        fetch_vendor(static_dir)
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    manifest = {}
+    for directory, subdirs, files in os.walk(static_dir):
+        if os.path.abspath(directory).startswith(os.path.abspath(out_dir)):
+            continue
+        for filename in sorted(files):
+            source = os.path.join(directory, filename)
+            name = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+            target = _fingerprinted(name, data)
+            _write(os.path.join(out_dir, target), data)
+            entry = {'file': target, 'integrity': _integrity(data), 'encodings': []}
+            if os.path.splitext(filename)[1].lower() in COMPRESSIBLE:
+                entry['encodings'] = _precompress(os.path.join(out_dir, target), data)
+            manifest[name] = entry
+    _write(os.path.join(out_dir, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+class AssetManifest:
+    """Resolves logical asset names to URLs for templates"""
+
+    def __init__(self, out_dir=DIST_DIR, url_prefix=URL_PREFIX, static_url='/static/'):
+        self.url_prefix = url_prefix
+        self.static_url = static_url
+        try:
+            with open(os.path.join(out_dir, MANIFEST_NAME)) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}  # not built: CDN and plain static files
+
+    def url(self, name):
+        entry = self.entries.get(name)
+        if entry is not None:
+            return self.url_prefix + entry['file']
+        if name in VENDOR:
+            return VENDOR[name][0]
+        return self.static_url + name
+
+    def integrity(self, name):
+        entry = self.entries.get(name)
+        if entry is not None:
+            return entry['integrity']
+        return VENDOR.get(name, (None, None))[1]
+
+    def tag(self, name, **attrs):
+        """<link> for stylesheets, <script> for scripts, with integrity when known"""
+        integrity = self.integrity(name)
+        extra = ''.join(f' {key.replace("_", "-")}="{escape(value)}"' for key, value in attrs.items())
+        if integrity:
+            extra += f' integrity="{integrity}" crossorigin="anonymous"'
+        if name.endswith('.css'):
+            return Markup(f'<link rel="stylesheet" href="{escape(self.url(name))}"{extra}>')
+        return Markup(f'<script src="{escape(self.url(name))}"{extra}></script>')
+
+    def register(self, app):
+        """Make asset_url and asset_tag available in the app's templates"""
+        app.jinja_env.globals.update(asset_url=self.url, asset_tag=self.tag)
+        return self
+
+
+def accepted_encodings(header):
+    """Encodings an Accept-Encoding header allows (anything not given q=0)"""
+    accepted = set()
+    for item in (header or '').split(','):
+        encoding, _, params = item.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if encoding:
+            accepted.add(encoding.strip().lower())
+    return accepted
+
+
+class AssetMiddleware:
+    """Serves out_dir under url_prefix, bypassing the app. Files are content-hashed, so they
+    are cached for a year as immutable, and a .br/.gz sibling is sent when the client accepts it."""
+
+    def __init__(self, app, out_dir=DIST_DIR, url_prefix=URL_PREFIX):
+        self.app = app
+        self.out_dir = os.path.abspath(out_dir)
+        self.url_prefix = url_prefix
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if not path.startswith(self.url_prefix) or environ['REQUEST_METHOD'] not in ('GET', 'HEAD'):
+            return self.app(environ, start_response)
+
+        filename = os.path.abspath(os.path.join(self.out_dir, path[len(self.url_prefix):]))
+        if (not filename.startswith(self.out_dir + os.sep) or not os.path.isfile(filename)
+                or os.path.basename(filename) == MANIFEST_NAME):
+            start_response('404 Not Found', [('Content-Type', 'text/plain'), ('Content-Length', '9')])
+            return [b'Not Found']
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        if mimetype.startswith('text/') or mimetype in ('application/javascript', 'image/svg+xml'):
+            mimetype += '; charset=utf-8'
+        headers = [
+            ('Content-Type', mimetype),
+            ('Cache-Control', f'public, max-age={ONE_YEAR}, immutable'),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        accepted = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING'))
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if encoding in accepted and os.path.isfile(filename + suffix):
+                filename += suffix
+                headers.append(('Content-Encoding', encoding))
+                break
+        # The name is the content hash, so the file name (with encoding) is a strong ETag
+        etag = '"' + os.path.basename(filename) + '"'
+        headers.append(('ETag', etag))
+        if environ.get('HTTP_IF_NONE_MATCH') == etag:
+            start_response('304 Not Modified', headers)
+            return []
+
+        headers.append(('Content-Length', str(os.path.getsize(filename))))
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        f = open(filename, 'rb')
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            return file_wrapper(f, 64 * 1024)
+        with f:
+            return [f.read()]
@@ -0,0 +1,171 @@
+"""
+Chunked bulk scoring for large CSV / NDJSON files of iris measurements.
+Input is read lazily, classified CHUNK_SIZE rows at a time and written back out
+chunk by chunk, so memory use does not depend on the size of the file.
+"""
+
+import csv
+import json
+import math
+from io import StringIO
+
+import numpy as np
+
+from iris_core.classifier import (FIELDS, SPECIES, COLUMN_ALIASES, MAX_MEASUREMENT, ClassifierEngine, get_engine,
+                                  probability_engine, predict_with_confidence)
+
+# Rows classified per NumPy pass
+CHUNK_SIZE = 5000
+
+FORMATS = ('csv', 'ndjson')
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+OUTPUT_COLUMNS = ['row', 'sl', 'sw', 'pl', 'pw', 'species', 'confidence', 'error']
+# Added before 'error' when class posteriors are asked for
+PROBABILITY_COLUMNS = ['p_' + name.split()[-1].lower() for name in SPECIES]
+
+
+def _normalize(name):
+    return ''.join(ch for ch in str(name).lower() if ch.isalnum())
+
+
+def detect_format(filename=None, content_type=None):
+    """Guess the input format from a filename or content type, defaulting to CSV"""
+    name = (filename or '').lower()
+    ctype = (content_type or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in ctype or 'jsonl' in ctype:
+        return 'ndjson'
+    return 'csv'
+
+
+def _header_columns(header):
+    """Map a CSV header row to the column index of each measurement"""
+    columns = [None] * len(FIELDS)
+    for index, name in enumerate(header):
+        field = COLUMN_ALIASES.get(_normalize(name))
+        if field is not None and columns[field] is None:
+            columns[field] = index
+    if None in columns:
+        raise ValueError("CSV header must name sepal length/width and petal length/width columns")
+    return columns
+
+
+def _csv_records(reader, columns, first_row):
+    if first_row is not None:
+        yield [first_row[i] if i < len(first_row) else None for i in columns]
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        yield [row[i] if i < len(row) else None for i in columns]
+
+
+def _ndjson_records(text_stream):
+    for line in text_stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        if isinstance(obj, dict):
+            values = [None] * len(FIELDS)
+            for key, value in obj.items():
+                field = COLUMN_ALIASES.get(_normalize(key))
+                if field is not None:
+                    values[field] = value
+            yield values
+        elif isinstance(obj, list):
+            yield obj[:len(FIELDS)]
+        else:
+            yield None
+
+
+def open_records(text_stream, input_format):
+    """Return a lazy iterator of raw measurement records from a text stream.
+    The CSV header (if any) is read eagerly so a bad header fails before any output is sent."""
+    if input_format == 'ndjson':
+        return _ndjson_records(text_stream)
+    if input_format != 'csv':
+        raise ValueError(f"Unsupported format '{input_format}'. Use one of: {', '.join(FORMATS)}")
+
+    reader = csv.reader(text_stream)
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        try:
+            [float(v) for v in row[:len(FIELDS)]]
+        except ValueError:
+            # First row is a header
+            return _csv_records(reader, _header_columns(row), None)
+        return _csv_records(reader, list(range(len(FIELDS))), row)
+    return iter(())
+
+
+def iter_chunks(records, chunk_size=CHUNK_SIZE):
+    """Group raw records into (X, bad_rows) chunks of at most chunk_size rows.
+    Rows that can't be parsed, or are out of range (see check_measurements), are zero-filled and
+    their offset is listed in bad_rows."""
+    rows = []
+    bad_rows = set()
+    for record in records:
+        try:
+            values = [float(v) for v in record]
+            if len(values) != len(FIELDS) or not all(math.isfinite(v) and abs(v) <= MAX_MEASUREMENT for v in values):
+                raise ValueError
+        except (TypeError, ValueError):
+            bad_rows.add(len(rows))
+            values = [0.0] * len(FIELDS)
+        rows.append(values)
+        if len(rows) >= chunk_size:
+            yield np.array(rows, dtype=np.float64), bad_rows
+            rows = []
+            bad_rows = set()
+    if rows:
+        yield np.array(rows, dtype=np.float64), bad_rows
+
+
+def score_records(records, output_format='csv', chunk_size=CHUNK_SIZE, engine=None, probabilities=False):
+    """Classify records chunk by chunk, yielding one block of output text per chunk.
+    With probabilities, each row also gets the posterior of every species (p_setosa, ...)."""
+    engine = engine if isinstance(engine, ClassifierEngine) else get_engine(engine)
+    if output_format not in FORMATS:
+        raise ValueError(f"Unsupported format '{output_format}'. Use one of: {', '.join(FORMATS)}")
+    columns = OUTPUT_COLUMNS[:-1] + PROBABILITY_COLUMNS + OUTPUT_COLUMNS[-1:] if probabilities else OUTPUT_COLUMNS
+    posteriors = probability_engine(engine) if probabilities else None
+
+    if output_format == 'csv':
+        yield ','.join(columns) + '\r\n'
+
+    row_number = 0
+    for X, bad_rows in iter_chunks(records, chunk_size):
+        indices, confidence = predict_with_confidence(X, engine)
+        species = SPECIES[indices].tolist()
+        confidence = confidence.tolist()
+        measurements = X.tolist()
+        proba = np.round(posteriors.predict_proba(X), 4).tolist() if probabilities else None
+
+        out = StringIO()
+        writer = csv.writer(out) if output_format == 'csv' else None
+        for i in range(len(measurements)):
+            row_number += 1
+            if i in bad_rows:
+                result = [row_number] + [''] * (len(columns) - 2) + ['Invalid measurements']
+            else:
+                result = [row_number] + measurements[i] + [species[i], confidence[i]] + (proba[i] if proba else []) + ['']
+
+            if writer is not None:
+                writer.writerow(result)
+            else:
+                entry = dict(zip(columns, result))
+                if i in bad_rows:
+                    entry = {'row': row_number, 'error': entry['error']}
+                else:
+                    del entry['error']
+                out.write(json.dumps(entry) + '\n')
+        yield out.getvalue()
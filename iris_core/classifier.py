@@ -0,0 +1,358 @@
+"""
+Iris classification engines.
+Routes ask get_engine() for the active engine instead of hard-coding the species rule,
+so the built-in threshold table and trained models are interchangeable.
+"""
+
+import os
+import pickle
+
+import numpy as np
+
+# Column order used for every measurement array
+FIELDS = ('sl', 'sw', 'pl', 'pw')
+
+SPECIES = np.array(["Iris Setosa", "Iris Versicolor", "Iris Virginica"])
+
+# Header / key spellings accepted for each measurement, after lower-casing
+# and dropping anything that isn't a letter or digit
+COLUMN_ALIASES = {
+    'sl': 0, 'sepallength': 0, 'sepallengthcm': 0,
+    'sw': 1, 'sepalwidth': 1, 'sepalwidthcm': 1,
+    'pl': 2, 'petallength': 2, 'petallengthcm': 2,
+    'pw': 3, 'petalwidth': 3, 'petalwidthcm': 3,
+}
+
+# Largest batch accepted by a single /predict/batch call
+MAX_BATCH_ROWS = 100000
+# Largest measurement (cm) classified; far beyond any flower, and small enough that every engine's
+# arithmetic (squared distances, Gaussian log densities) stays finite
+MAX_MEASUREMENT = 1e6
+
+
+def check_measurements(X):
+    """Raise ValueError unless every value in X is a finite number within MAX_MEASUREMENT cm"""
+    if not np.isfinite(X).all():
+        raise ValueError("Measurements must be finite numbers")
+    if (np.abs(X) > MAX_MEASUREMENT).any():
+        raise ValueError(f"Measurements must be within {MAX_MEASUREMENT:g} cm")
+
+
+def rows_to_array(rows):
+    """Convert a list of measurement rows (dicts or 4-item lists) into an (n, 4) float array"""
+    if not isinstance(rows, list):
+        raise ValueError("Rows must be a JSON array")
+    if not rows:
+        return np.empty((0, len(FIELDS)), dtype=np.float64)
+
+    try:
+        data = [[row[f] for f in FIELDS] if isinstance(row, dict) else row for row in rows]
+        X = np.asarray(data, dtype=np.float64)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Each row needs numeric sl, sw, pl and pw values")
+
+    if X.ndim != 2 or X.shape[1] != len(FIELDS):
+        raise ValueError("Each row needs exactly 4 measurements (sl, sw, pl, pw)")
+    check_measurements(X)
+    return X
+
+
+class ClassifierEngine:
+    """Base class for classifier engines. Subclasses implement predict_array."""
+
+    name = 'base'
+
+    def predict_array(self, X):
+        """Return (species index array, confidence array 0-100) for an (n, 4) array"""
+        raise NotImplementedError
+
+    def predict(self, sl, sw, pl, pw):
+        """Classify a single flower, returning (species name, confidence)"""
+        indices, confidence = self.predict_array(np.array([[sl, sw, pl, pw]], dtype=np.float64))
+        return str(SPECIES[indices[0]]), float(confidence[0])
+
+
+class DecisionTableEngine(ClassifierEngine):
+    """Single-feature threshold rule compiled into lookup tables.
+
+    The thresholds split one measurement into bins (one per species). Each bin gets a
+    precomputed anchor, direction and scale, so classification is one searchsorted
+    call and confidence is a table lookup plus one fused expression.
+    """
+
+    name = 'decision_table'
+
+    def __init__(self, thresholds=(2.5, 4.8), feature=2, tail=2.0):
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+        self.feature = feature
+        edges = np.concatenate(([0.0], self.thresholds))
+
+        # Confidence is the distance from the nearest boundary relative to the bin width.
+        # The last bin has no upper edge, so it grows away from its lower edge over `tail` cm.
+        self._anchor = np.append(self.thresholds, self.thresholds[-1])
+        self._direction = np.append(-np.ones(len(self.thresholds)), 1.0)
+        self._scale = np.append(np.diff(edges), tail) / 100.0
+
+    def predict_array(self, X):
+        values = X[:, self.feature]
+        indices = np.searchsorted(self.thresholds, values, side='right')
+        confidence = (values - self._anchor[indices]) * self._direction[indices] / self._scale[indices]
+        return indices, np.round(np.clip(confidence, 0, 100), 1)
+
+
+class TreeEngine(ClassifierEngine):
+    """Small decision tree stored as flat node arrays (as written by iris_core/training.py).
+
+    Node i splits on feature[i] at threshold[i] (going left when the value is <= it); leaves
+    have feature -1 and point to themselves, so every row can take `depth` steps in lockstep
+    without checking where it stopped. counts[i] holds the training rows of each species
+    that reached node i, and confidence is the share of the predicted species in the leaf.
+    """
+
+    name = 'tree'
+
+    def __init__(self, feature, threshold, left, right, counts):
+        self.feature = np.asarray(feature)
+        self.threshold = np.asarray(threshold)
+        self.left = np.asarray(left)
+        self.right = np.asarray(right)
+        self.counts = np.asarray(counts)
+        self.depth = self._depth()
+        # Leaves only: the split arrays can be memory-mapped, this is computed once
+        totals = self.counts.sum(axis=1)
+        self._species = self.counts.argmax(axis=1)
+        self._confidence = np.round(self.counts.max(axis=1) / np.maximum(totals, 1) * 100, 1)
+
+    def _depth(self):
+        depth, level = 0, np.array([0])
+        while True:
+            level = level[self.feature[level] >= 0]
+            if not len(level):
+                return depth
+            level = np.concatenate((self.left[level], self.right[level]))
+            depth += 1
+
+    def predict_array(self, X):
+        rows = np.arange(len(X))
+        node = np.zeros(len(X), dtype=np.intp)
+        for _ in range(self.depth):
+            goes_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(goes_left, self.left[node], self.right[node])
+        return self._species[node], self._confidence[node]
+
+
+class GaussianEngine(ClassifierEngine):
+    """Per-species Gaussian model over all four measurements, giving class posteriors.
+
+    LDA (one covariance shared by every species) by default, or QDA (one per species).
+    Everything that doesn't depend on the input is computed once: each species keeps the
+    whitening matrix W (inverse Cholesky factor of its covariance), W @ mean, and a constant
+    holding the log prior and log normalizer. Scoring n rows is then a single (n, 4) x (4, 12)
+    matrix product and a log-sum-exp, the same for one flower as for a million rows.
+    """
+
+    name = 'gaussian'
+
+    # Rows scored per pass, to bound the (rows, species, 4) intermediate
+    CHUNK_ROWS = 65536
+
+    def __init__(self, means, covariances, priors):
+        self.means = np.asarray(means, dtype=np.float64)
+        self.covariances = np.asarray(covariances, dtype=np.float64)
+        self.priors = np.asarray(priors, dtype=np.float64)
+        k, d = self.means.shape
+        whitening = np.empty((k, d, d))
+        log_det = np.empty(k)
+        for c in range(k):
+            cholesky = np.linalg.cholesky(self.covariances[c])
+            whitening[c] = np.linalg.inv(cholesky)
+            log_det[c] = 2 * np.log(np.diag(cholesky)).sum()
+        # x @ _projection gives W_c x for every species side by side
+        self._projection = np.ascontiguousarray(whitening.transpose(2, 0, 1).reshape(d, k * d))
+        self._offset = np.einsum('kij,kj->ki', whitening, self.means)
+        self._constant = np.log(self.priors) - 0.5 * (log_det + d * np.log(2 * np.pi))
+
+    @classmethod
+    def fit(cls, X, y, shared=True, shrinkage=0.0):
+        """Estimate means, covariances and priors from labelled rows. shrinkage (0-1) pulls the
+        covariances towards their diagonal, which keeps them invertible on small samples."""
+        k, d = len(SPECIES), X.shape[1]
+        if np.bincount(y, minlength=k).min() < 2:
+            raise ValueError("Every species needs at least 2 rows")
+        means = np.array([X[y == c].mean(axis=0) for c in range(k)])
+        priors = np.bincount(y, minlength=k) / len(y)
+        centered = [X[y == c] - means[c] for c in range(k)]
+        if shared:
+            pooled = sum(z.T @ z for z in centered) / max(len(y) - k, 1)
+            covariances = np.repeat(pooled[None], k, axis=0)
+        else:
+            covariances = np.array([z.T @ z / max(len(z) - 1, 1) for z in centered])
+        diagonal = np.einsum('kii->ki', covariances)
+        covariances = (1 - shrinkage) * covariances + shrinkage * np.einsum('ki,ij->kij', diagonal, np.eye(d))
+        covariances += 1e-9 * np.eye(d)
+        return cls(means, covariances, priors)
+
+    def log_likelihood(self, X):
+        """(n, species) log of prior x class density for each row"""
+        k = len(self.priors)
+        z = (X @ self._projection).reshape(len(X), k, -1) - self._offset
+        return self._constant - 0.5 * np.einsum('nki,nki->nk', z, z)
+
+    def predict_proba(self, X):
+        """(n, species) posterior probabilities; each row sums to 1"""
+        out = np.empty((len(X), len(self.priors)))
+        for start in range(0, len(X), self.CHUNK_ROWS):
+            with np.errstate(over='ignore', invalid='ignore'):
+                scores = self.log_likelihood(X[start:start + self.CHUNK_ROWS])
+                scores -= scores.max(axis=1, keepdims=True)
+            np.exp(scores, out=scores)
+            # Measurements so far out that every density underflows carry no evidence either way
+            scores[~np.isfinite(scores).all(axis=1)] = 1.0
+            out[start:start + self.CHUNK_ROWS] = scores / scores.sum(axis=1, keepdims=True)
+        return out
+
+    def predict_array(self, X):
+        proba = self.predict_proba(X)
+        best = proba.argmax(axis=1)
+        return best, np.round(proba[np.arange(len(X)), best] * 100, 1)
+
+
+def _species_index(label):
+    """Map a model's class label (0/1/2, 'setosa', 'Iris-virginica', ...) to a SPECIES index"""
+    if isinstance(label, (int, np.integer)):
+        return int(label)
+    name = str(label).lower()
+    for index, species in enumerate(SPECIES):
+        if species.split()[-1].lower() in name:
+            return index
+    raise ValueError(f"Unknown class label: {label!r}")
+
+
+class ModelEngine(ClassifierEngine):
+    """Wraps a trained model with a scikit-learn style predict / predict_proba interface."""
+
+    def __init__(self, model, name='model'):
+        self.model = model
+        self.name = name
+        self._label_map = np.array([_species_index(c) for c in getattr(model, 'classes_', range(len(SPECIES)))])
+
+    def predict_array(self, X):
+        if hasattr(self.model, 'predict_proba'):
+            proba = np.asarray(self.model.predict_proba(X))
+            best = proba.argmax(axis=1)
+            return self._label_map[best], np.round(proba.max(axis=1) * 100, 1)
+        labels = np.asarray(self.model.predict(X))
+        indices = np.array([_species_index(label) for label in labels.tolist()], dtype=np.intp)
+        return indices, np.full(len(indices), 100.0)
+
+
+def load_model_engine(path, name='model'):
+    """Load a pickled model from disk (only use files you trust)"""
+    with open(path, 'rb') as f:
+        return ModelEngine(pickle.load(f), name=name)
+
+
+# Engine registry: name -> engine instance
+_engines = {}
+# Name a model from MODEL_DIR is registered under by model_store once it has loaded (train_model.py)
+TRAINED_ENGINE = 'trained'
+
+_default_engine = os.environ.get('CLASSIFIER_ENGINE', DecisionTableEngine.name)
+
+
+def register_engine(engine, name=None, default=False):
+    """Make an engine available to the routes, optionally as the default"""
+    global _default_engine
+    name = name or engine.name
+    _engines[name] = engine
+    if default:
+        _default_engine = name
+    return engine
+
+
+def get_engine(name=None):
+    """Return a registered engine, or the default engine when no name is given"""
+    if not name and _default_engine not in _engines:
+        name = DecisionTableEngine.name  # the default is a trained model that hasn't loaded (yet)
+    name = name or _default_engine
+    try:
+        return _engines[name]
+    except KeyError:
+        raise ValueError(f"Unknown classifier engine '{name}'. Available: {', '.join(sorted(_engines))}")
+
+
+def available_engines():
+    return sorted(_engines)
+
+
+register_engine(DecisionTableEngine())
+
+
+def _reference_gaussian():
+    """LDA fitted on data/iris.csv: 150 rows, so fitting at startup costs well under a millisecond"""
+    from iris_core.training import load_dataset  # imported here: training builds on this module
+    X, y = load_dataset()
+    return GaussianEngine.fit(X, y)
+
+
+# Class posteriors for every engine that doesn't produce its own (see probability_engine)
+try:
+    register_engine(_reference_gaussian())
+except (OSError, ValueError, np.linalg.LinAlgError) as e:
+    print(f"Could not fit the gaussian engine: {str(e)}")
+
+# A trained model can be plugged in without code changes via CLASSIFIER_MODEL_PATH
+if os.environ.get('CLASSIFIER_MODEL_PATH'):
+    try:
+        register_engine(load_model_engine(os.environ['CLASSIFIER_MODEL_PATH']))
+        print(f"Loaded classifier model from {os.environ['CLASSIFIER_MODEL_PATH']}")
+    except Exception as e:
+        print(f"Failed to load classifier model: {str(e)}")
+
+if _default_engine not in _engines and _default_engine != TRAINED_ENGINE:
+    print(f"WARNING: Unknown CLASSIFIER_ENGINE '{_default_engine}', using {DecisionTableEngine.name}")
+    _default_engine = DecisionTableEngine.name
+
+
+def probability_engine(engine=None):
+    """The engine that gives class posteriors for engine: itself if it has predict_proba,
+    otherwise the gaussian engine"""
+    engine = engine if isinstance(engine, ClassifierEngine) else get_engine(engine)
+    if hasattr(engine, 'predict_proba'):
+        return engine
+    if GaussianEngine.name not in _engines:
+        raise ValueError("Class probabilities are unavailable: the gaussian engine couldn't be fitted")
+    return _engines[GaussianEngine.name]
+
+
+def posterior_confidence(X, indices, engine=None):
+    """Posterior probability (0-100) of the given species for each row, all four measurements considered"""
+    proba = probability_engine(engine).predict_proba(X)
+    return np.round(proba[np.arange(len(X)), indices] * 100, 1)
+
+
+def predict_with_confidence(X, engine=None):
+    """(species indices, confidence 0-100) for an (n, 4) array. The confidence is the posterior of
+    the predicted species (see posterior_confidence), or the engine's own score without a gaussian engine."""
+    engine = engine if isinstance(engine, ClassifierEngine) else get_engine(engine)
+    indices, confidence = engine.predict_array(X)
+    try:
+        return indices, posterior_confidence(X, indices, engine)
+    except ValueError:
+        return indices, confidence
+
+
+def predict_rows(rows, engine=None, probabilities=False):
+    """Classify a list of rows in one pass, returning a list of {species, confidence} dicts,
+    plus {probabilities: {species: posterior}} when asked"""
+    X = rows_to_array(rows)
+    engine = get_engine(engine)
+    indices, confidence = predict_with_confidence(X, engine)
+    species = SPECIES[indices].tolist()
+    results = [{'species': s, 'confidence': c} for s, c in zip(species, confidence.tolist())]
+    if probabilities:
+        names = SPECIES.tolist()
+        proba = np.round(probability_engine(engine).predict_proba(X), 4).tolist()
+        for result, row in zip(results, proba):
+            result['probabilities'] = dict(zip(names, row))
+    return results
@@ -0,0 +1,181 @@
+"""
+Single-flight coalescing for /ask.
+
+When several requests ask the same (normalized) question at once, the first one calls Gemini
+and the rest wait for its answer instead of making calls of their own. Within a worker the
+waiters share the call directly. When the answer cache is shared (ASK_CACHE_PATH) the first
+worker to ask also claims the question in that SQLite file, and the other workers wait for
+the claim to be released and read the answer from the cache.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from iris_core.llm import LLM_TIMEOUT
+
+# How long a claim is honoured if the worker holding it dies without releasing it
+ASK_COALESCE_LEASE = float(os.environ.get('ASK_COALESCE_LEASE', LLM_TIMEOUT + 10))  # seconds
+POLL_INTERVAL = 0.05  # seconds between checks for another worker's answer
+
+
+class CoalescedCallError(Exception):
+    """Raised to waiters when the shared call produced no answer"""
+
+
+class CallRejected(Exception):
+    """Raised by do() when the caller would have started a new call but admit() refused it"""
+
+
+class _Flight:
+    def __init__(self, key, remote=False):
+        self.key = key
+        self.remote = remote  # another worker is making the call
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls by key"""
+
+    def __init__(self, path=None, lease=ASK_COALESCE_LEASE):
+        self.path = path
+        self.lease = lease
+        self._flights = {}  # key -> _Flight
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if path:
+            conn = self._conn()
+            with conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS ask_inflight (
+                        key TEXT PRIMARY KEY,
+                        expires_at REAL NOT NULL
+                    )""")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _claim(self, key):
+        """Claim key for this worker; False if another worker holds a live claim"""
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM ask_inflight WHERE key = ? AND expires_at <= ?", (key, now))
+                claimed = conn.execute("INSERT OR IGNORE INTO ask_inflight (key, expires_at) VALUES (?, ?)",
+                                       (key, now + self.lease)).rowcount == 1
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return claimed
+        except sqlite3.Error as e:
+            print(f"Could not claim in-flight question: {str(e)}")
+            return True  # coalesce within this worker only
+
+    def _release(self, key):
+        try:
+            self._conn().execute("DELETE FROM ask_inflight WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"Could not release in-flight question: {str(e)}")
+
+    def _claimed_elsewhere(self, key):
+        if not self.path:
+            return False
+        try:
+            return self._conn().execute(
+                "SELECT 1 FROM ask_inflight WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone() is not None
+        except sqlite3.Error:
+            return False
+
+    def in_flight(self, key):
+        """True if a call for key is already running in this or (with a shared path) another worker"""
+        return key in self._flights or self._claimed_elsewhere(key)
+
+    def begin(self, key, admit=None):
+        """Join the call for key or start one. Returns (flight, role), role being
+        'leader' (make the call, then finish()), 'follower' or 'remote' (wait()).
+
+        admit() is only called when the caller would lead a new call, e.g. to charge a rate
+        limit. It runs under the same lock as the lookup, so nobody can finish or join the call
+        in between. When it returns False no call is started and the result is (None, 'rejected')."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, 'follower'
+            if self.path and not self._claim(key):
+                flight = self._flights[key] = _Flight(key, remote=True)
+                return flight, 'remote'
+            if admit is not None and not admit():
+                if self.path:
+                    self._release(key)
+                return None, 'rejected'
+            flight = self._flights[key] = _Flight(key)
+        return flight, 'leader'
+
+    def finish(self, flight, result=None, error=None):
+        """Publish the leader's result (or exception) to everyone waiting on flight; later calls do nothing"""
+        if flight.done.is_set():
+            return
+        flight.result = result
+        flight.error = error
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        if self.path and not flight.remote:
+            self._release(flight.key)
+        flight.done.set()
+
+    def wait(self, flight, role, lookup=None, timeout=None):
+        """Wait for the answer of a call someone else is making. For the 'remote' role,
+        lookup(key) reads the other worker's answer once its claim is released."""
+        timeout = self.lease if timeout is None else timeout
+        if role == 'remote':
+            deadline = time.monotonic() + timeout
+            while self._claimed_elsewhere(flight.key) and time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+            result = lookup(flight.key) if lookup else None
+            if result is None:
+                self.finish(flight, error=CoalescedCallError("The shared AI request didn't produce an answer"))
+            else:
+                self.finish(flight, result=result)
+        elif not flight.done.wait(timeout):
+            raise CoalescedCallError("Timed out waiting for the shared AI request")
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def do(self, key, fn, *args, lookup=None, admit=None, **kwargs):
+        """Run fn(*args, **kwargs) unless the same key is already running; returns (result, shared).
+        Raises CallRejected if a new call was needed and admit() refused it (see begin)."""
+        flight, role = self.begin(key, admit)
+        if role == 'rejected':
+            raise CallRejected(key)
+        if role != 'leader':
+            return self.wait(flight, role, lookup), True
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.finish(flight, error=e)
+            raise
+        self.finish(flight, result=result)
+        return result, False
+
+
+def create_single_flight():
+    """Coalesce across workers when ASK_CACHE_PATH names a shared SQLite answer cache"""
+    path = os.environ.get('ASK_CACHE_PATH') or None
+    try:
+        return SingleFlight(path=path)
+    except sqlite3.Error as e:
+        print(f"Could not open {path} for request coalescing: {str(e)} - coalescing within each worker only")
+        return SingleFlight()
@@ -0,0 +1,151 @@
+"""
+Response compression middleware.
+
+Compresses text responses (HTML, JSON, NDJSON, CSV, JS, CSS...) with brotli when the brotli
+module is installed and the client accepts it, otherwise gzip. Bodies with a known length under
+COMPRESS_MIN_SIZE are left alone. Streamed responses are compressed chunk by chunk with a sync
+flush after each one, so /ask/stream and /export still reach the client as they are produced.
+Buffered responses that carry an ETag (the cached landing page, for instance) keep their
+compressed form in a small LRU so the same bytes aren't compressed twice.
+"""
+
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from iris_core.assets import accepted_encodings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # bytes
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))  # gzip 1-9
+COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))  # 0-11; higher is much slower
+
+# Matched as prefixes of the media type. NDJSON is listed under each name in use (/export sends
+# application/jsonl, /ask/stream and /predict/upload application/x-ndjson) rather than riding on
+# application/json being a prefix of one of them.
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/jsonl', 'application/x-ndjson', 'application/ndjson',
+    'application/javascript', 'application/xml', 'image/svg+xml',
+)
+# Compressed bodies kept per worker, keyed by ETag and encoding
+ETAG_CACHE_SIZE = 128
+
+
+class _Encoder:
+    def __init__(self, encoding, level, quality):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=quality)
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+    def chunk(self, data):
+        """Compress data and flush, so everything so far can be decoded by the client"""
+        if self.encoding == 'br':
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressionMiddleware:
+    """WSGI middleware negotiating br/gzip from Accept-Encoding"""
+
+    def __init__(self, app, min_size=COMPRESS_MIN_SIZE, level=COMPRESS_LEVEL, brotli_quality=COMPRESS_BROTLI_QUALITY):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self._cache = OrderedDict()  # (etag, encoding) -> compressed body
+        self._lock = threading.Lock()
+
+    def _choose_encoding(self, environ):
+        accepted = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING'))
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return None
+
+    def _should_compress(self, status, headers):
+        if not status.startswith('200'):
+            return False
+        values = {name.lower(): value for name, value in headers}
+        content_type = values.get('content-type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        if 'content-encoding' in values or 'no-transform' in values.get('cache-control', ''):
+            return False
+        length = values.get('content-length')
+        return length is None or int(length) >= self.min_size
+
+    def __call__(self, environ, start_response):
+        encoding = self._choose_encoding(environ)
+        state = {'compress': False, 'etag': None}  # etag: set only for buffered responses
+
+        def compressing_start_response(status, headers, exc_info=None):
+            headers = list(headers)
+            content_type = next((v for k, v in headers if k.lower() == 'content-type'), '')
+            if content_type.split(';')[0].strip().lower().startswith(COMPRESSIBLE_TYPES):
+                vary = [v for k, v in headers if k.lower() == 'vary']
+                if not any('accept-encoding' in v.lower() for v in vary):
+                    headers.append(('Vary', 'Accept-Encoding'))
+            if encoding and environ['REQUEST_METHOD'] != 'HEAD' and self._should_compress(status, headers):
+                state['compress'] = True
+                updated = []
+                for name, value in headers:
+                    lower = name.lower()
+                    if lower == 'content-length':
+                        continue
+                    if lower == 'etag' and not value.startswith('W/'):
+                        # Same content, different bytes: only a weak validator is still true
+                        if any(k.lower() == 'content-length' for k, _ in headers):
+                            state['etag'] = value
+                        value = 'W/' + value
+                    updated.append((name, value))
+                updated.append(('Content-Encoding', encoding))
+                headers = updated
+            return start_response(status, headers, exc_info)
+
+        body = self.app(environ, compressing_start_response)
+        if not state['compress']:
+            return body
+        return self._compress(body, encoding, state['etag'])
+
+    def _compress(self, body, encoding, etag):
+        try:
+            # Buffered bodies (known length) with an ETag are compressed once and reused
+            if etag is not None:
+                key = (etag, encoding)
+                with self._lock:
+                    cached = self._cache.get(key)
+                    if cached is not None:
+                        self._cache.move_to_end(key)
+                if cached is None:
+                    encoder = _Encoder(encoding, self.level, self.brotli_quality)
+                    cached = encoder.chunk(b''.join(body)) + encoder.finish()
+                    with self._lock:
+                        self._cache[key] = cached
+                        while len(self._cache) > ETAG_CACHE_SIZE:
+                            self._cache.popitem(last=False)
+                yield cached
+                return
+
+            encoder = _Encoder(encoding, self.level, self.brotli_quality)
+            for data in body:
+                if data:
+                    compressed = encoder.chunk(data)
+                    if compressed:
+                        yield compressed
+            yield encoder.finish()
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
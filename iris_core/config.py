@@ -0,0 +1,57 @@
+"""
+Per-platform settings for create_app (see iris_core/factory.py).
+
+A profile only holds what really differs between hosts: how the app is labelled and what users
+are told when Gemini can't be reached. Everything else (caches, limiter, classifier engine...)
+is read from environment variables by the iris_core modules, the same way on every platform.
+"""
+
+import os
+
+
+class Config:
+    """Local development and anything not recognised as a hosting platform"""
+    PLATFORM = 'local'
+    APP_VERSION = '1.0.1'
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key')
+    GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
+    # Unlocks the /admin routes (sent as X-Admin-Token); they 404 without it
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+    # Appended to offline answers to say why Gemini wasn't used
+    AI_UNAVAILABLE_REASON = "Check that GOOGLE_API_KEY is set and that this server can reach Google's API."
+
+
+class RenderConfig(Config):
+    PLATFORM = 'render'
+    APP_VERSION = '1.0.1-render'
+    AI_UNAVAILABLE_REASON = "Render.com's free tier has limited external API access."
+
+
+class PythonAnywhereConfig(Config):
+    PLATFORM = 'pythonanywhere'
+    APP_VERSION = '1.0.1-noplots'
+    AI_UNAVAILABLE_REASON = "PythonAnywhere's free tier has limited external API access."
+
+
+PROFILES = {
+    'local': Config,
+    'render': RenderConfig,
+    'pythonanywhere': PythonAnywhereConfig,
+}
+
+
+def detect_platform(default='local'):
+    """Name of the hosting platform we're running on, from the variables each one sets"""
+    if 'PYTHONANYWHERE_SITE' in os.environ:
+        return 'pythonanywhere'
+    if 'RENDER' in os.environ:
+        return 'render'
+    return default
+
+
+def get_config(name=None, default='local'):
+    """The profile called name, else IRIS_CONFIG, else the detected platform's"""
+    name = (name or os.environ.get('IRIS_CONFIG') or detect_platform(default)).lower()
+    if name not in PROFILES:
+        raise ValueError(f"Unknown config profile '{name}'. Use one of: {', '.join(PROFILES)}")
+    return PROFILES[name]
@@ -0,0 +1,114 @@
+"""
+The reference flowers (data/iris.csv) in columnar form, for charts drawn in the browser.
+
+Every response is built once and kept as immutable bytes with a strong ETag. The JSON form has
+one array per column. With encoding=float32, each measurement column is a base64 string of
+little-endian float32 values, which the browser can wrap in a Float32Array without parsing
+numbers. Species are a column of codes into the species list. When pyarrow is installed, the
+same columns are also available as an Arrow IPC stream.
+"""
+
+import base64
+import hashlib
+import json
+import threading
+
+import numpy as np
+
+from iris_core.classifier import FIELDS, SPECIES
+from iris_core.neighbors import reference_set
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # Arrow output is optional
+    pyarrow = None
+
+COLUMNS = FIELDS + ('species',)
+FORMATS = {'json': 'application/json', 'arrow': 'application/vnd.apache.arrow.stream'}
+ENCODINGS = ('numbers', 'float32')
+
+
+class ColumnarDataset:
+    """Labelled measurements served as columns, each projection and format built once"""
+
+    def __init__(self, X, y):
+        self.columns = {field: np.ascontiguousarray(X[:, i], dtype='<f4') for i, field in enumerate(FIELDS)}
+        self.columns['species'] = np.asarray(y, dtype=np.uint8)
+        # The JSON numbers come from the original values, so 5.1 stays 5.1 rather than its float32 expansion
+        self._values = {field: X[:, i].tolist() for i, field in enumerate(FIELDS)}
+        self._values['species'] = self.columns['species'].tolist()
+        self.count = len(y)
+        self._bodies = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_reference(cls):
+        if reference_set is None:
+            return None
+        return cls(reference_set.X, reference_set.y)
+
+    def formats(self):
+        return [name for name in FORMATS if name != 'arrow' or pyarrow is not None]
+
+    def parse_fields(self, fields):
+        """Column names from a comma-separated ?fields= value (all columns when empty)"""
+        if not fields:
+            return COLUMNS
+        names = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = [name for name in names if name not in COLUMNS]
+        if unknown or not names:
+            raise ValueError(f"Unknown field(s) {', '.join(unknown) or repr(fields)}. Available: {', '.join(COLUMNS)}")
+        return tuple(name for name in COLUMNS if name in names)  # canonical order, so variants share a body
+
+    def body(self, fields=COLUMNS, output_format='json', encoding='numbers'):
+        """Return (bytes, strong etag) for the given columns, format and JSON encoding"""
+        if output_format not in self.formats():
+            raise ValueError(f"Unsupported format '{output_format}'. Use one of: {', '.join(self.formats())}")
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unsupported encoding '{encoding}'. Use one of: {', '.join(ENCODINGS)}")
+        key = (tuple(fields), output_format, encoding if output_format == 'json' else None)
+        entry = self._bodies.get(key)
+        if entry is None:
+            body = self._arrow(fields) if output_format == 'arrow' else self._json(fields, encoding)
+            entry = (body, hashlib.sha256(body).hexdigest()[:32])
+            with self._lock:
+                entry = self._bodies.setdefault(key, entry)
+        return entry
+
+    def _json(self, fields, encoding):
+        columns = {}
+        for name in fields:
+            if encoding == 'float32':
+                columns[name] = base64.b64encode(self.columns[name].tobytes()).decode('ascii')
+            else:
+                columns[name] = self._values[name]
+        document = {
+            'count': self.count,
+            'encoding': encoding,
+            'dtypes': {name: 'float32' if name in FIELDS else 'uint8' for name in fields},
+            'species': SPECIES.tolist(),
+            'columns': columns,
+        }
+        return json.dumps(document, separators=(',', ':')).encode('utf-8')
+
+    def _arrow(self, fields):
+        arrays = []
+        for name in fields:
+            if name == 'species':
+                arrays.append(pyarrow.DictionaryArray.from_arrays(
+                    pyarrow.array(self.columns[name], type=pyarrow.uint8()), pyarrow.array(SPECIES.tolist())))
+            else:
+                arrays.append(pyarrow.array(self.columns[name], type=pyarrow.float32()))
+        table = pyarrow.table(arrays, names=list(fields))
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    def warm(self):
+        """Build the full-column bodies now rather than on the first request"""
+        for output_format in self.formats():
+            for encoding in ENCODINGS if output_format == 'json' else ENCODINGS[:1]:
+                self.body(COLUMNS, output_format, encoding)
+        return self
@@ -0,0 +1,169 @@
+"""
+Streaming export of prediction history.
+Entries are pulled from the history store lazily and encoded a batch at a time,
+so an export never holds more than one batch of rows in memory.
+"""
+
+import csv
+import json
+import zlib
+from datetime import datetime
+from io import StringIO
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+
+from iris_core.history import TIMESTAMP_FORMAT
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/jsonl',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+CSV_HEADER = ['Timestamp', 'Sepal Length', 'Sepal Width', 'Petal Length', 'Petal Width', 'Prediction']
+
+# Entries encoded per yielded chunk
+BATCH_SIZE = 500
+
+
+def parse_date_bound(value, end=False):
+    """Parse a YYYY-MM-DD or 'YYYY-MM-DD HH:MM:SS' filter into a comparable timestamp string.
+    A bare date used as an end bound covers the whole day."""
+    if not value:
+        return None
+    for fmt in (TIMESTAMP_FORMAT, "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt == "%Y-%m-%d" and end:
+            parsed = parsed.replace(hour=23, minute=59, second=59)
+        return parsed.strftime(TIMESTAMP_FORMAT)
+    raise ValueError(f"Invalid date '{value}'. Use YYYY-MM-DD or YYYY-MM-DD HH:MM:SS")
+
+
+def check_format(fmt):
+    """Raise ValueError if fmt can't be exported in this environment"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}'. Use one of: {', '.join(FORMATS)}")
+    if fmt == 'parquet' and pa is None:
+        raise ValueError("Parquet export requires the optional pyarrow package")
+
+
+def _batches(entries, size=BATCH_SIZE):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _flatten(entry):
+    m = entry['measurements']
+    return [entry['timestamp'], m['sl'], m['sw'], m['pl'], m['pw'], entry['prediction']]
+
+
+def _csv_chunks(entries):
+    out = StringIO()
+    writer = csv.writer(out)
+    writer.writerow(CSV_HEADER)
+    yield out.getvalue()
+    for batch in _batches(entries):
+        out.seek(0)
+        out.truncate()
+        writer.writerows(_flatten(entry) for entry in batch)
+        yield out.getvalue()
+
+
+def _jsonl_chunks(entries):
+    for batch in _batches(entries):
+        yield ''.join(json.dumps({
+            'timestamp': entry['timestamp'],
+            'sl': entry['measurements']['sl'],
+            'sw': entry['measurements']['sw'],
+            'pl': entry['measurements']['pl'],
+            'pw': entry['measurements']['pw'],
+            'prediction': entry['prediction'],
+        }) + '\n' for entry in batch)
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator"""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _parquet_chunks(entries):
+    schema = pa.schema([
+        ('timestamp', pa.string()),
+        ('sl', pa.float64()), ('sw', pa.float64()), ('pl', pa.float64()), ('pw', pa.float64()),
+        ('prediction', pa.string()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        # One row group per batch; each is flushed to the client as soon as it's written
+        for batch in _batches(entries):
+            columns = list(zip(*(_flatten(entry) for entry in batch)))
+            writer.write_table(pa.Table.from_arrays([pa.array(c) for c in columns], schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_chunks(entries, fmt='csv'):
+    """Encode history entries in the given format, yielding one chunk per batch"""
+    check_format(fmt)
+    if fmt == 'csv':
+        return _csv_chunks(entries)
+    if fmt == 'jsonl':
+        return _jsonl_chunks(entries)
+    return _parquet_chunks(entries)
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of str/bytes chunks incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,1018 @@
+"""
+The Iris Predictor Flask app.
+
+create_app(config) builds it for any platform profile (see iris_core/config.py). app_render.py
+and app_noplots.py are thin wrappers around it, so every deployment runs the same code: the
+render cache, rate limiter, answer cache, coalescing, circuit breaker and classifier engine.
+"""
+
+from flask import Flask, render_template, request, session, jsonify, Response, stream_with_context, g, url_for
+from flask import before_render_template, template_rendered
+from flask.sessions import SecureCookieSessionInterface
+from werkzeug.http import http_date
+import traceback  # For more detailed error logging
+from datetime import datetime
+import os
+import io
+import hashlib
+import hmac
+import json
+import time
+
+import numpy as np
+
+from iris_core.config import get_config
+from iris_core.classifier import (get_engine, predict_rows, predict_with_confidence, rows_to_array, check_measurements,
+                                  MAX_BATCH_ROWS, FIELDS)
+from iris_core.neighbors import nearest_flowers
+from iris_core.plots import PlotRenderer, PLOT_FORMAT, FORMATS as PLOT_FORMATS
+from iris_core.dataset import ColumnarDataset, FORMATS as DATASET_FORMATS
+from iris_core import bulk
+from iris_core import model_store
+from iris_core.history import create_history_store, make_entry, new_session_id
+from iris_core import export as export_format
+from iris_core.rate_limit import create_rate_limiter
+from iris_core.ask_cache import create_answer_cache, cache_key
+from iris_core.fallback import create_fallback_index
+from iris_core.coalesce import create_single_flight, CoalescedCallError, CallRejected
+from iris_core.llm import LLMCallPool, CircuitBreaker, CircuitOpenError
+from iris_core.gemini import LazyModel, GEMINI_MODEL
+from iris_core import metrics
+from iris_core.profiling import Profiler
+from iris_core.page_cache import PageCache, etag_matches
+from iris_core.assets import ROOT, AssetManifest, AssetMiddleware
+from iris_core.compression import CompressionMiddleware
+
+# Metrics (exposed on /metrics, aggregated across gunicorn workers)
+REQUEST_LATENCY = metrics.histogram('iris_http_request_duration_seconds', 'Time to produce a response, by route', ['route', 'method', 'status'])
+TEMPLATE_RENDER_LATENCY = metrics.histogram('iris_template_render_seconds', 'Jinja template rendering time', ['template'])
+SESSION_SAVE_LATENCY = metrics.histogram('iris_session_save_seconds', 'Time spent serializing and signing the session cookie')
+GEMINI_LATENCY = metrics.histogram('iris_gemini_request_duration_seconds', 'Gemini call latency, including failed calls', ['mode'])
+GEMINI_ERRORS = metrics.counter('iris_gemini_errors_total', 'Failed Gemini calls', ['reason'])
+FALLBACK_RESPONSES = metrics.counter('iris_ask_fallback_responses_total', 'Pre-defined answers served because Gemini failed')
+RATE_LIMIT_REJECTIONS = metrics.counter('iris_rate_limit_rejections_total', 'Requests rejected by the rate limiter', ['route'])
+ASK_CACHE_LOOKUPS = metrics.counter('iris_ask_cache_lookups_total', 'Answer cache lookups', ['result'])
+ASK_COALESCED = metrics.counter('iris_ask_coalesced_total', 'Questions answered by sharing an identical in-flight Gemini call', ['route'])
+HISTORY_ENTRIES_ADDED = metrics.counter('iris_history_entries_added_total', 'Predictions written to history')
+HISTORY_SIZE = metrics.histogram('iris_history_session_entries', 'History size of sessions viewing their history', buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000))
+ASK_CACHE_ENTRIES = metrics.gauge('iris_ask_cache_entries', 'Answers held in memory by the answer cache')
+PLOT_CACHE_ENTRIES = metrics.gauge('iris_plot_cache_entries', 'Decision plots held in memory by the plot cache')
+LLM_IN_FLIGHT = metrics.gauge('iris_llm_calls_in_flight', 'Gemini calls running or queued')
+LLM_CIRCUIT_OPEN = metrics.gauge('iris_gemini_circuit_open', '1 while the Gemini circuit breaker is open or half-open')
+LLM_DEADLINE = metrics.gauge('iris_gemini_deadline_seconds', 'Current adaptive deadline for Gemini calls')
+
+# Samples a fraction of index/export/ask requests; off unless PROFILE_SAMPLE_RATE or /admin/profiling turns it on
+profiler = Profiler()
+
+IRIS_DESCRIPTIONS = {
+    "Iris Setosa": "Setosa has short petals and a compact structure, commonly found in grassy fields.",
+    "Iris Versicolor": "Versicolor has medium-sized petals with a blend of blue and violet shades.",
+    "Iris Virginica": "Virginica is a larger variant with deep purple petals found in wetlands."
+}
+
+IRIS_VIDEOS = {
+    "Iris Setosa": "https://www.youtube.com/embed/08u4Z8Po5mQ?autoplay=1",
+    "Iris Versicolor": "https://www.youtube.com/embed/ScTaR_FPWWg?autoplay=1",
+    "Iris Virginica": "https://www.youtube.com/embed/nCYUzkil2xQ?autoplay=1"
+}
+
+LANDING_TEMPLATE = "index_noplots.html"
+
+# Enhanced context focusing on botanical and biological aspects
+ASK_CONTEXT = """
+        You are a botanical expert specializing in iris flowers and plant biology. Focus on:
+
+        1. Iris Species Information:
+        - Iris Setosa: Small petals, compact structure, adapted to grassy fields, distinctive blue-violet flowers
+        - Iris Versicolor: Medium-sized petals, blue-violet coloration, found in mixed habitats
+        - Iris Virginica: Large petals, deep purple coloration, typically found in wetland environments
+
+        2. Botanical Features:
+        - Sepal: Modified leaves that protect the flower bud
+        - Petal: Colored parts of the flower that attract pollinators
+        - Key measurements: Sepal length/width, Petal length/width
+
+        3. Biological Context:
+        - Plant taxonomy
+        - Growth patterns
+        - Environmental adaptations
+        - Reproductive strategies
+        - Ecological relationships
+
+        Provide clear, accurate, and scientific information while keeping explanations accessible.
+
+        Question: """
+
+ASK_CACHE_NAMESPACE = hashlib.sha256((GEMINI_MODEL + ASK_CONTEXT).encode('utf-8')).hexdigest()[:16]
+
+
+def calculate_confidence(measurements):
+    """Posterior probability (0-100) of the species the active engine predicts, from all four
+    measurements (see GaussianEngine)"""
+    X = np.array([[measurements[f] for f in FIELDS]], dtype=np.float64)
+    return float(predict_with_confidence(X)[1][0])
+
+
+def make_generation_config():
+    """Simplified model generation settings with conservative limits"""
+    # A plain dict is accepted by generate_content and avoids importing the SDK up front
+    return {
+        'temperature': 0.7,
+        'top_p': 0.8,
+        'top_k': 40,
+        'max_output_tokens': 500  # Limit response length to save memory
+    }
+
+
+def _ndjson(event):
+    return json.dumps(event) + "\n"
+
+
+class TimedSessionInterface(SecureCookieSessionInterface):
+    """Signed cookie sessions, with the cost of saving them recorded"""
+
+    _serializers = {}
+
+    def get_signing_serializer(self, app):
+        # Flask builds a new serializer on every request, which costs more than serving
+        # the cached landing page; reuse it while the secret key is unchanged
+        serializer = self._serializers.get(app.secret_key)
+        if serializer is None:
+            serializer = super().get_signing_serializer(app)
+            if serializer is not None:
+                self._serializers[app.secret_key] = serializer
+        return serializer
+
+    def save_session(self, app, session, response):
+        with SESSION_SAVE_LATENCY.time():
+            return super().save_session(app, session, response)
+
+
+class Services:
+    """The stores, caches and clients one app's requests share (app.extensions['iris'])"""
+
+    def __init__(self, config):
+        api_key = config.get('GOOGLE_API_KEY')
+        if not api_key:
+            print("WARNING: Missing GOOGLE_API_KEY environment variable")
+            api_key = "dummy_key_for_initialization"
+        self.ai_unavailable_reason = config['AI_UNAVAILABLE_REASON']
+
+        # The Gemini model is built on first use; the connectivity test runs in the background
+        # (see GEMINI_STARTUP_PROBE) and is reported by /health, so creating the app is instant
+        self.model = LazyModel(api_key).start()
+
+        # Prediction history lives server-side; the session cookie only holds an opaque id
+        self.history_store = create_history_store()
+
+        # Rate limiting configuration (shared across gunicorn workers, see iris_core/rate_limit.py)
+        self.rate_limiter = create_rate_limiter()
+
+        # Answers to repeated questions are served from here without calling Gemini
+        self.answer_cache = create_answer_cache()
+
+        # Offline answers for when Gemini can't be reached, indexed once at startup
+        self.fallback_index = create_fallback_index()
+
+        # Gemini calls run on a bounded pool with a deadline so they can't pin every request thread.
+        # While Gemini keeps failing the breaker opens and /ask answers offline without waiting for it.
+        self.llm_pool = LLMCallPool(breaker=CircuitBreaker())
+
+        # Shares one Gemini call between concurrent identical questions (across workers with ASK_CACHE_PATH)
+        self.coalescer = create_single_flight()
+
+        # The landing page is rendered once per worker; only the remaining request count changes
+        self.landing_page = PageCache()
+
+        # Decision plots: background drawn once per engine, finished images kept in an LRU
+        self.plot_renderer = PlotRenderer()
+
+        # The reference flowers as columns for client-side charts (/dataset), encoded once
+        self.dataset = ColumnarDataset.from_reference()
+        if self.dataset is not None:
+            self.dataset.warm()
+
+        # The trained classifier from MODEL_DIR (train_model.py), reloaded when a new one is published
+        self.model_watcher = model_store.start_watcher()
+        if PLOT_FORMAT in PLOT_FORMATS:
+            self.plot_renderer.background()  # drawn now rather than on the first prediction
+
+    @property
+    def api_rate_limit(self):
+        return self.rate_limiter.limit  # 5 requests per day by default
+
+    def get_session_id(self, create=False):
+        """Return the history id for this browser session, creating one if asked"""
+        session_id = session.get('sid')
+        if session_id is None and create:
+            session_id = session['sid'] = new_session_id()
+
+        # Move history left over in old cookie-based sessions into the store
+        if session_id is not None and 'history' in session:
+            for entry in session.pop('history'):
+                self.history_store.add(session_id, entry)
+        return session_id
+
+    def admit_ai_call(self, ip_address, permit):
+        """Reserve the circuit breaker's permission for a new Gemini call, then charge the call to
+        ip_address; False if over the limit. permit['reserved'] is set once both are held, for
+        llm_pool.call(reserved=True). When the breaker refuses (open, or another request is the
+        half-open probe) the answer comes from the offline index, which is free."""
+        breaker = self.llm_pool.breaker
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            return True
+        if self.is_rate_limited(ip_address):
+            breaker.abandon()
+            return False
+        permit['reserved'] = True
+        return True
+
+    def release_ai_call(self, permit):
+        """Give back a breaker permission that admit_ai_call reserved but no call used"""
+        if permit.pop('reserved', False):
+            self.llm_pool.breaker.abandon()
+
+    def is_rate_limited(self, ip_address):
+        """Check if the IP address has exceeded the rate limit, counting this request if not"""
+        return not self.rate_limiter.hit(ip_address)
+
+    def get_remaining_requests(self, ip_address):
+        """Get the number of remaining requests for the IP address"""
+        return self.rate_limiter.remaining(ip_address)
+
+    def get_fallback_answer(self, question):
+        """Pick a pre-defined answer for when the AI service can't be reached"""
+        answer = self.fallback_index.answer(question)
+        if answer:
+            return answer + f"\n\n(Note: This is a pre-defined response as the AI service couldn't be reached. {self.ai_unavailable_reason})"
+
+        # Default fallback response
+        return f"I'm sorry, but I couldn't connect to the AI service. {self.ai_unavailable_reason}\n\nThe Iris Predictor can still classify iris flowers based on measurements. For basic information: Setosa has short petals (<2.5cm), Versicolor has medium petals (2.5-4.8cm), and Virginica has longer petals (>4.8cm)."
+
+
+def create_app(config=None):
+    """Build the app. config is a profile class or name from iris_core/config.py; by default
+    IRIS_CONFIG or the detected platform's profile."""
+    if config is None or isinstance(config, str):
+        config = get_config(config)
+
+    app = Flask(__name__, root_path=ROOT)
+    app.config.from_object(config)
+    services = app.extensions['iris'] = Services(app.config)
+
+    # Fingerprinted static assets built by build_assets.py, served from /assets/ ahead of Flask,
+    # and gzip/brotli for every text response
+    AssetManifest().register(app)
+    app.wsgi_app = CompressionMiddleware(AssetMiddleware(app.wsgi_app))
+    app.session_interface = TimedSessionInterface()
+
+    _register_instrumentation(app, services)
+    _register_prediction_routes(app, services)
+    _register_ask_routes(app, services)
+    _register_admin_routes(app, services)
+
+    print(f"Running with the '{app.config['PLATFORM']}' configuration")
+    return app
+
+
+def _register_instrumentation(app, services):
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.pop('request_start', None)
+        if start is not None:
+            # For streamed responses this is the time to the first byte
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_LATENCY.observe(time.perf_counter() - start, route=route, method=request.method, status=response.status_code)
+        metrics.flush()
+        return response
+
+    @before_render_template.connect_via(app)
+    def start_render_timer(sender, template, context, **extra):
+        g.render_start = time.perf_counter()
+
+    @template_rendered.connect_via(app)
+    def record_render_time(sender, template, context, **extra):
+        start = g.pop('render_start', None)
+        if start is not None:
+            TEMPLATE_RENDER_LATENCY.observe(time.perf_counter() - start, template=template.name)
+
+    @metrics.on_collect
+    def update_gauges():
+        ASK_CACHE_ENTRIES.set(len(services.answer_cache))
+        PLOT_CACHE_ENTRIES.set(len(services.plot_renderer))
+        LLM_IN_FLIGHT.set(services.llm_pool.in_flight)
+        LLM_CIRCUIT_OPEN.set(0 if services.llm_pool.breaker.state == 'closed' else 1)
+        LLM_DEADLINE.set(services.llm_pool.breaker.deadline())
+
+
+def _register_prediction_routes(app, services):
+    history_store = services.history_store
+    landing_page = services.landing_page
+
+    def landing_last_modified():
+        return http_date(os.path.getmtime(os.path.join(app.root_path, app.template_folder, LANDING_TEMPLATE)))
+
+    landing_modified_at = landing_last_modified()
+
+    def render_landing_page(remaining_requests):
+        """GET / from the render cache, with ETag and Last-Modified for conditional requests"""
+        last_modified = landing_modified_at
+        if app.debug:
+            landing_page.clear()  # pick up template edits
+            last_modified = landing_last_modified()
+
+        def render(placeholder):
+            # One rendering for "requests left" and one for "limit reached" (alert style, disabled button)
+            return render_template(LANDING_TEMPLATE,
+                                   prediction=None,
+                                   description=None,
+                                   video_url=None,
+                                   remaining_requests=placeholder if remaining_requests > 0 else 0,
+                                   rate_limit=services.api_rate_limit)
+
+        body, etag = landing_page.render(remaining_requests > 0, max(0, remaining_requests), render)
+        headers = {
+            'ETag': f'"{etag}"',
+            'Last-Modified': last_modified,
+            # The count is per client, so shared caches must not store it, and browsers must revalidate
+            'Cache-Control': 'private, no-cache',
+        }
+        # Plain header comparisons: werkzeug's make_conditional costs more than serving the page
+        if_none_match = request.headers.get('If-None-Match')
+        if etag_matches(if_none_match, etag) or (
+                if_none_match is None and request.headers.get('If-Modified-Since') == last_modified):
+            return Response(status=304, headers=headers)
+        return Response(body, mimetype='text/html', headers=headers)
+
+    @app.route("/", methods=["GET", "POST"])
+    @profiler.profile('index')
+    def index():
+        prediction = None
+        confidence = None
+        neighbors = None
+        plot_url = None
+        description = None
+        video_url = None
+
+        # Get client IP address
+        ip_address = request.remote_addr
+
+        # Get remaining requests
+        remaining_requests = services.get_remaining_requests(ip_address)
+
+        # GET: the landing page from the render cache
+        if request.method != "POST":
+            return render_landing_page(remaining_requests)
+
+        try:
+            sl = float(request.form["sl"])
+            sw = float(request.form["sw"])
+            pl = float(request.form["pl"])
+            pw = float(request.form["pw"])
+
+            try:
+                # The same range every other route enforces, rather than a guess for absurd values
+                check_measurements(np.array([sl, sw, pl, pw]))
+            except ValueError as e:
+                prediction = f"Error: {e}"
+            else:
+                prediction = get_engine().predict(sl, sw, pl, pw)[0]
+
+            if prediction and 'Error' not in prediction:
+                confidence = calculate_confidence({'sl': sl, 'sw': sw, 'pl': pl, 'pw': pw})
+                try:
+                    neighbors = nearest_flowers([[sl, sw, pl, pw]])[0]
+                except ValueError as e:
+                    print(f"Nearest flowers unavailable: {str(e)}")
+                if PLOT_FORMAT in PLOT_FORMATS:
+                    # Bucketed in the URL too, so browsers reuse images for nearby measurements. v names
+                    # the engine's background, so a newly loaded model gets new URLs rather than stale images
+                    plot_url = url_for('plot', output_format=PLOT_FORMAT,
+                                       pl=services.plot_renderer.quantize(pl),
+                                       pw=services.plot_renderer.quantize(pw),
+                                       v=services.plot_renderer.background().digest)
+                description = IRIS_DESCRIPTIONS.get(prediction, "No description available.")
+                video_url = IRIS_VIDEOS.get(prediction)
+
+                # Add to history
+                history_entry = make_entry({'sl': sl, 'sw': sw, 'pl': pl, 'pw': pw}, prediction)
+                history_store.add(services.get_session_id(create=True), history_entry)
+                HISTORY_ENTRIES_ADDED.inc()
+
+        except ValueError:
+            prediction = "Error: Please enter valid numbers for all fields."
+        except Exception as e:
+            # Starts with "Error" so the template shows it as one, not as a species
+            prediction = f"Error: An unexpected error occurred: {e}"
+            traceback.print_exc()
+        if prediction and 'Error' in prediction:
+            confidence = neighbors = plot_url = description = video_url = None
+
+        # Always return the template, whether or not the prediction succeeded
+        return render_template(LANDING_TEMPLATE,
+                               prediction=prediction,
+                               confidence=confidence,
+                               neighbors=neighbors,
+                               plot_url=plot_url,
+                               description=description,
+                               video_url=video_url,
+                               remaining_requests=remaining_requests,
+                               rate_limit=services.api_rate_limit)
+
+    @app.route("/plot.<output_format>")
+    def plot(output_format):
+        """Decision regions in the petal plane with ?pl=&pw= marked, as png or svg"""
+        if output_format not in PLOT_FORMATS:
+            return jsonify({
+                'success': False,
+                'error': f"Unsupported plot format. Use one of: {', '.join(PLOT_FORMATS)}"
+            }), 404
+        pl = request.args.get('pl', type=float)
+        pw = request.args.get('pw', type=float)
+        if pl is None or pw is None or not np.isfinite([pl, pw]).all():
+            return jsonify({
+                'success': False,
+                'error': 'Send pl and pw (petal length and width in cm) as numbers'
+            }), 400
+
+        plot = services.plot_renderer.background()
+        image, etag = services.plot_renderer.render(output_format, pl, pw, plot.engine)
+        # Only a URL naming the current background may be cached for long; any other (an old
+        # page, or no v) must be revalidated, so it picks up the next model's regions
+        if request.args.get('v') == plot.digest:
+            cache_control = 'public, max-age=3600'
+        else:
+            cache_control = 'no-cache'
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': cache_control}
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return Response(status=304, headers=headers)
+        return Response(image, mimetype=PLOT_FORMATS[output_format], headers=headers)
+
+    @app.route("/dataset")
+    def dataset():
+        """The reference flowers as columns: ?fields=pl,pw,species to project, ?format=json|arrow,
+        ?encoding=float32 for base64 float32 columns in JSON"""
+        if services.dataset is None:
+            return jsonify({
+                'success': False,
+                'error': 'The reference dataset could not be loaded'
+            }), 503
+        try:
+            output_format = request.args.get('format', 'json')
+            body, etag = services.dataset.body(services.dataset.parse_fields(request.args.get('fields')),
+                                               output_format, request.args.get('encoding', 'numbers'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': 'public, max-age=86400'}
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return Response(status=304, headers=headers)
+        return Response(body, mimetype=DATASET_FORMATS[output_format], headers=headers)
+
+    @app.route("/predict/batch", methods=["POST"])
+    def predict_batch():
+        """Classify many measurement rows in one request (?probabilities=1 adds class posteriors,
+        ?neighbors=k the k closest reference flowers)"""
+        if not request.is_json:
+            return jsonify({
+                'success': False,
+                'error': 'Request must be JSON'
+            }), 400
+
+        payload = request.get_json(silent=True)
+        # Accept either a bare array or {"rows": [...]}
+        rows = payload.get('rows') if isinstance(payload, dict) else payload
+
+        if isinstance(rows, list) and len(rows) > MAX_BATCH_ROWS:
+            return jsonify({
+                'success': False,
+                'error': f'Batch too large. Send at most {MAX_BATCH_ROWS} rows per request.'
+            }), 413
+
+        try:
+            predictions = predict_rows(rows, request.args.get('engine'),
+                                       probabilities=request.args.get('probabilities') in ('1', 'true'))
+            if request.args.get('neighbors'):
+                k = request.args.get('neighbors', type=int)
+                if k is None:
+                    raise ValueError("neighbors must be a whole number")
+                for prediction, near in zip(predictions, nearest_flowers(rows_to_array(rows), k)):
+                    prediction['neighbors'] = near
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        return jsonify({
+            'success': True,
+            'count': len(predictions),
+            'predictions': predictions
+        })
+
+    @app.route("/predict/upload", methods=["POST"])
+    def predict_upload():
+        """Score an uploaded CSV or NDJSON file, streaming results back chunk by chunk
+        (?probabilities=1 adds p_setosa, p_versicolor and p_virginica)"""
+        # Multipart uploads are spooled to disk by Werkzeug; raw bodies are read straight off the socket
+        upload = request.files.get('file')
+        if upload is not None:
+            stream, filename, content_type = upload.stream, upload.filename, upload.mimetype
+        else:
+            stream, filename, content_type = request.stream, None, request.mimetype
+
+        input_format = request.args.get('input') or bulk.detect_format(filename, content_type)
+        output_format = request.args.get('output') or input_format
+
+        try:
+            text_stream = io.TextIOWrapper(stream, encoding='utf-8', errors='replace', newline='')
+            records = bulk.open_records(text_stream, input_format)
+            if output_format not in bulk.FORMATS:
+                raise ValueError(f"Unsupported format '{output_format}'. Use one of: {', '.join(bulk.FORMATS)}")
+            engine = get_engine(request.args.get('engine'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        response = Response(
+            stream_with_context(bulk.score_records(records, output_format, engine=engine,
+                                                   probabilities=request.args.get('probabilities') in ('1', 'true'))),
+            mimetype=bulk.MIMETYPES[output_format]
+        )
+        response.headers["Content-Disposition"] = f"attachment; filename=iris_scores.{output_format}"
+        return response
+
+    @app.route("/export")
+    @profiler.profile('export')
+    def export():
+        """Stream this session's history as CSV, JSON Lines or Parquet, optionally gzipped"""
+        fmt = request.args.get('format', 'csv').lower()
+        compress = request.args.get('compress', '').lower() == 'gzip'
+
+        try:
+            export_format.check_format(fmt)
+            start = export_format.parse_date_bound(request.args.get('start'))
+            end = export_format.parse_date_bound(request.args.get('end'), end=True)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        session_id = services.get_session_id()
+        entries = history_store.iter_entries(session_id, start, end) if session_id else iter(())
+        chunks = export_format.export_chunks(entries, fmt)
+
+        filename = f"iris_predictions.{fmt}"
+        mimetype = export_format.MIMETYPES[fmt]
+        if compress:
+            chunks = export_format.gzip_chunks(chunks)
+            filename += ".gz"
+            mimetype = "application/gzip"
+
+        output = Response(stream_with_context(chunks), mimetype=mimetype)
+        output.headers["Content-Disposition"] = f"attachment; filename={filename}"
+        return output
+
+    @app.route("/history")
+    def history():
+        """Return this session's prediction history, newest first, one page at a time"""
+        try:
+            page = max(1, int(request.args.get('page', 1)))
+            per_page = min(200, max(1, int(request.args.get('per_page', 50))))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'page and per_page must be integers'
+            }), 400
+
+        session_id = services.get_session_id()
+        if session_id is None:
+            return jsonify({'success': True, 'page': page, 'per_page': per_page, 'total': 0, 'entries': []})
+
+        total = history_store.count(session_id)
+        HISTORY_SIZE.observe(total)
+        return jsonify({
+            'success': True,
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'entries': history_store.page(session_id, offset=(page - 1) * per_page, limit=per_page)
+        })
+
+    # Add a route to check API usage
+    @app.route("/api-status")
+    def api_status():
+        ip_address = request.remote_addr
+        remaining = services.get_remaining_requests(ip_address)
+        return jsonify({
+            'ip_address': ip_address,
+            'remaining_requests': remaining,
+            'limit': services.api_rate_limit,
+            'reset_time': services.rate_limiter.reset_time(ip_address).strftime("%Y-%m-%d %H:%M:%S")
+        })
+
+
+def _register_ask_routes(app, services):
+    model = services.model
+    answer_cache = services.answer_cache
+    llm_pool = services.llm_pool
+    coalescer = services.coalescer
+
+    def generate_answer(question, key, permit):
+        """Ask Gemini and cache the answer; runs once for each group of identical in-flight questions.
+        permit comes from Services.admit_ai_call."""
+        print(f"Attempting to call Gemini API with question: {question[:50]}...")
+        try:
+            if not permit.pop('reserved', False):
+                raise CircuitOpenError("AI service is unavailable (circuit open)")
+            with GEMINI_LATENCY.time(mode='sync'):
+                response = llm_pool.call(
+                    model.generate_content,
+                    ASK_CONTEXT + question,
+                    generation_config=make_generation_config(),
+                    reserved=True
+                )
+
+            if response and hasattr(response, 'text'):
+                answer = response.text.strip()
+                # Clean up the response
+                answer = answer.replace('<', '&lt;').replace('>', '&gt;')
+
+                print("Successfully received response from Gemini API")
+                answer_cache.set(key, answer)
+                return answer
+            else:
+                print("API returned invalid response format")
+                raise Exception("Invalid response format from API")
+        except Exception as api_error:
+            GEMINI_ERRORS.inc(reason=type(api_error).__name__)
+            raise
+
+    @app.route("/ask", methods=["POST"])
+    @profiler.profile('ask_question')
+    def ask_question():
+        if not request.is_json:
+            return jsonify({
+                'success': False,
+                'error': 'Request must be JSON'
+            }), 400
+
+        try:
+            question = request.json.get('question')
+            if not question:
+                return jsonify({
+                    'success': False,
+                    'error': 'Question is required'
+                }), 400
+
+            # Cached answers skip both the Gemini call and the rate limit charge
+            key = cache_key(question, ASK_CACHE_NAMESPACE)
+            cached_answer = answer_cache.get(key)
+            ASK_CACHE_LOOKUPS.inc(result='miss' if cached_answer is None else 'hit')
+            if cached_answer is not None:
+                return jsonify({
+                    'success': True,
+                    'answer': cached_answer,
+                    'cached': True
+                })
+
+            # Get client IP address
+            ip_address = request.remote_addr
+
+            try:
+                # Try to use the API with fallback mechanism; identical questions asked at the same
+                # time share one Gemini call. Only a request that starts a call is charged against
+                # the rate limit (offline answers while the circuit is open don't count either).
+                permit = {}
+                try:
+                    answer, shared = coalescer.do(key, generate_answer, question, key, permit,
+                                                  lookup=answer_cache.get,
+                                                  admit=lambda: services.admit_ai_call(ip_address, permit))
+                    if shared:
+                        ASK_COALESCED.inc(route='/ask')
+                    return jsonify({
+                        'success': True,
+                        'answer': answer
+                    })
+
+                except CallRejected:
+                    RATE_LIMIT_REJECTIONS.inc(route='/ask')
+                    return jsonify({
+                        'success': False,
+                        'error': f'Rate limit exceeded. You can only make {services.api_rate_limit} requests per day.'
+                    }), 429
+
+                except Exception as api_error:
+                    print(f"API call failed: {str(api_error)}")
+
+                    # Fallback to pre-defined responses
+                    print("Using fallback response system")
+                    FALLBACK_RESPONSES.inc()
+                    return jsonify({
+                        'success': True,
+                        'answer': services.get_fallback_answer(question)
+                    })
+
+            except Exception as model_error:
+                print(f"Model generation error: {str(model_error)}")
+                return jsonify({
+                    'success': False,
+                    'error': f'Error generating response: {str(model_error)}'
+                }), 500
+
+        except Exception as e:
+            print(f"Error in /ask endpoint: {str(e)}")
+            return jsonify({
+                'success': False,
+                'error': f'An error occurred: {str(e)}'
+            }), 500
+
+    def stream_answer(question, key, cached_answer=None, flight=None, role=None, permit=None):
+        """Yield NDJSON events ({"delta": ...} then {"done": true}) as the answer is generated.
+        flight and role come from coalescer.begin(), permit from Services.admit_ai_call."""
+        if cached_answer is not None:
+            yield _ndjson({'delta': cached_answer})
+            yield _ndjson({'done': True, 'cached': True})
+            return
+
+        if role != 'leader':
+            # The same question is already being answered: wait for it and send it in one piece
+            try:
+                answer = coalescer.wait(flight, role, lookup=answer_cache.get)
+            except Exception as api_error:
+                print(f"Shared API call failed: {str(api_error)}")
+                print("Using fallback response system")
+                FALLBACK_RESPONSES.inc()
+                yield _ndjson({'delta': services.get_fallback_answer(question)})
+                yield _ndjson({'done': True, 'fallback': True})
+                return
+            ASK_COALESCED.inc(route='/ask/stream')
+            yield _ndjson({'delta': answer})
+            yield _ndjson({'done': True, 'coalesced': True})
+            return
+
+        parts = []
+        answer = None
+        start = time.perf_counter()
+        try:
+            try:
+                if not (permit or {}).pop('reserved', False):
+                    raise CircuitOpenError("AI service is unavailable (circuit open)")
+                chunks = llm_pool.stream(
+                    model.generate_content,
+                    ASK_CONTEXT + question,
+                    generation_config=make_generation_config(),
+                    stream=True,
+                    reserved=True
+                )
+                for chunk in chunks:
+                    try:
+                        text = chunk.text
+                    except (AttributeError, ValueError):  # empty or blocked chunk
+                        continue
+                    if text:
+                        # Escaping is per character, so escaping each piece is the same as escaping the whole answer
+                        text = text.replace('<', '&lt;').replace('>', '&gt;')
+                        parts.append(text)
+                        yield _ndjson({'delta': text})
+            except Exception as api_error:
+                print(f"Streaming API call failed: {str(api_error)}")
+                GEMINI_ERRORS.inc(reason=type(api_error).__name__)
+                GEMINI_LATENCY.observe(time.perf_counter() - start, mode='stream')
+                if not parts:
+                    print("Using fallback response system")
+                    FALLBACK_RESPONSES.inc()
+                    yield _ndjson({'delta': services.get_fallback_answer(question)})
+                    yield _ndjson({'done': True, 'fallback': True})
+                else:
+                    yield _ndjson({'error': 'The AI response was interrupted. Please try again.'})
+                return
+
+            GEMINI_LATENCY.observe(time.perf_counter() - start, mode='stream')
+            answer = ''.join(parts).strip()
+            if answer:
+                answer_cache.set(key, answer)
+            yield _ndjson({'done': True})
+        finally:
+            # Also runs if the client disconnects, so waiters are never left hanging
+            if answer:
+                coalescer.finish(flight, result=answer)
+            else:
+                coalescer.finish(flight, error=CoalescedCallError("The shared AI request didn't produce an answer"))
+
+    @app.route("/ask/stream", methods=["POST"])
+    @profiler.profile('ask_question_stream')
+    def ask_question_stream():
+        """Same as /ask, but streams the answer as NDJSON while Gemini is still generating it"""
+        if not request.is_json:
+            return jsonify({
+                'success': False,
+                'error': 'Request must be JSON'
+            }), 400
+
+        question = (request.get_json(silent=True) or {}).get('question')
+        if not question or not isinstance(question, str):
+            return jsonify({
+                'success': False,
+                'error': 'Question is required'
+            }), 400
+
+        key = cache_key(question, ASK_CACHE_NAMESPACE)
+        cached_answer = answer_cache.get(key)
+        ASK_CACHE_LOOKUPS.inc(result='miss' if cached_answer is None else 'hit')
+        flight = role = None
+        permit = {}
+        if cached_answer is None:
+            # Joining an identical in-flight call is free; starting one is charged (see Services.admit_ai_call)
+            ip_address = request.remote_addr
+            flight, role = coalescer.begin(key, admit=lambda: services.admit_ai_call(ip_address, permit))
+            if role == 'rejected':
+                RATE_LIMIT_REJECTIONS.inc(route='/ask/stream')
+                return jsonify({
+                    'success': False,
+                    'error': f'Rate limit exceeded. You can only make {services.api_rate_limit} requests per day.'
+                }), 429
+
+        response = Response(stream_with_context(stream_answer(question, key, cached_answer, flight, role, permit)),
+                            mimetype='application/x-ndjson')
+        if role in ('leader', 'remote'):
+            # If the body is never read (HEAD, client gone) the call this request owns must still end,
+            # and a breaker permission it reserved but never used goes back
+            def close_flight():
+                services.release_ai_call(permit)
+                coalescer.finish(flight, error=CoalescedCallError("The shared AI request didn't produce an answer"))
+
+            response.call_on_close(close_flight)
+        # Ask proxies not to buffer the stream
+        response.headers['X-Accel-Buffering'] = 'no'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    # Add a test endpoint for the AI API
+    @app.route("/test-ai")
+    def test_ai():
+        import google.generativeai as genai
+
+        try:
+            # Get API key from environment
+            api_key = os.environ.get('GOOGLE_API_KEY')
+            if not api_key:
+                return jsonify({
+                    'success': False,
+                    'error': 'GOOGLE_API_KEY environment variable not set',
+                    'env_vars': list(os.environ.keys())  # List available env vars (safe ones only)
+                })
+
+            # Try to configure the API
+            try:
+                genai.configure(api_key=api_key)
+                print("API configured successfully")
+            except Exception as config_error:
+                return jsonify({
+                    'success': False,
+                    'error': f'API configuration error: {str(config_error)}'
+                })
+
+            # Try to initialize the model
+            try:
+                test_model = genai.GenerativeModel('gemini-2.0-flash')
+                print("Model initialized successfully")
+            except Exception as model_error:
+                return jsonify({
+                    'success': False,
+                    'error': f'Model initialization error: {str(model_error)}'
+                })
+
+            # Try a simple generation
+            try:
+                response = test_model.generate_content("What is an Iris flower? Answer in one sentence.")
+                print("Content generated successfully")
+                answer = response.text if hasattr(response, 'text') else 'No text attribute'
+                return jsonify({
+                    'success': True,
+                    'message': 'API test successful',
+                    'response': answer
+                })
+            except Exception as generate_error:
+                return jsonify({
+                    'success': False,
+                    'error': f'Content generation error: {str(generate_error)}'
+                })
+
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': f'General error: {str(e)}'
+            })
+
+
+def _register_admin_routes(app, services):
+    admin_token = app.config.get('ADMIN_TOKEN')
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        """Prometheus scrape endpoint"""
+        return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    def is_admin():
+        """Admin routes need the ADMIN_TOKEN, sent as an X-Admin-Token header"""
+        token = request.headers.get('X-Admin-Token', '')
+        return bool(admin_token) and hmac.compare_digest(token.encode('utf-8'), admin_token.encode('utf-8'))
+
+    @app.route("/admin/profiling", methods=["GET", "POST"])
+    def admin_profiling():
+        """Show or change profiler settings; POST {"sample_rate": 0.05, "tracemalloc": true, "reset": false}"""
+        if not is_admin():
+            return jsonify({'success': False, 'error': 'Not found'}), 404
+
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            try:
+                sample_rate = data.get('sample_rate')
+                if sample_rate is not None:
+                    sample_rate = float(sample_rate)
+            except (TypeError, ValueError):
+                return jsonify({
+                    'success': False,
+                    'error': 'sample_rate must be a number between 0 and 1'
+                }), 400
+            profiler.update_settings(sample_rate=sample_rate,
+                                     trace_allocations=data.get('tracemalloc'),
+                                     reset=bool(data.get('reset')))
+
+        return jsonify(dict(profiler.status(), success=True))
+
+    @app.route("/admin/profiling/flamegraph")
+    def admin_profiling_flamegraph():
+        """Collapsed stack samples, for flamegraph.pl or speedscope"""
+        if not is_admin():
+            return jsonify({'success': False, 'error': 'Not found'}), 404
+        return Response(profiler.collapsed_stacks(), mimetype='text/plain')
+
+    @app.route("/admin/profiling/cprofile")
+    def admin_profiling_cprofile():
+        """cProfile report for one endpoint (?endpoint=index) or all of them"""
+        if not is_admin():
+            return jsonify({'success': False, 'error': 'Not found'}), 404
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in ('cumulative', 'tottime', 'ncalls', 'pcalls', 'filename', 'name'):
+            return jsonify({
+                'success': False,
+                'error': 'sort must be one of cumulative, tottime, ncalls, pcalls, filename, name'
+            }), 400
+        try:
+            limit = min(500, max(1, int(request.args.get('limit', 40))))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'limit must be an integer'
+            }), 400
+        report = profiler.cprofile_report(request.args.get('endpoint') or None, sort=sort, limit=limit)
+        return Response(report, mimetype='text/plain')
+
+    @app.route("/admin/profiling/allocations")
+    def admin_profiling_allocations():
+        """Peak allocation per profiled request and the top allocation sites (needs tracemalloc on)"""
+        if not is_admin():
+            return jsonify({'success': False, 'error': 'Not found'}), 404
+        return jsonify(dict(profiler.allocation_report(), success=True))
+
+    # Add a simple health check endpoint
+    @app.route("/health")
+    def health_check():
+        return jsonify({
+            'status': 'ok',
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'app_version': app.config['APP_VERSION'],
+            'platform': app.config['PLATFORM'],
+            'python_version': os.environ.get('PYTHON_VERSION', 'unknown'),
+            'ai': dict(services.model.health(), circuit=services.llm_pool.breaker.snapshot()),
+            'classifier': dict(services.model_watcher.status(), engine=get_engine().name)
+        })
+
+
+def run(app):
+    """Serve app with Flask's development server (python app_render.py)"""
+    # Get port from environment variable or default to 5000
+    port = int(os.environ.get("PORT", 5000))
+
+    # Run the app - ensure proper binding for production environments
+    try:
+        app.run(host='0.0.0.0', port=port, debug=False)
+    except Exception as e:
+        print(f"Error starting the application: {str(e)}")
+        # Try alternative port if specified port is unavailable
+        alt_port = int(os.environ.get("ALTERNATIVE_PORT", 8080))
+        print(f"Attempting to start on alternative port {alt_port}")
+        app.run(host='0.0.0.0', port=alt_port, debug=False)
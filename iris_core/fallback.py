@@ -0,0 +1,115 @@
+"""
+Offline answer engine for /ask when Gemini can't be reached.
+
+A knowledge base of iris facts (data/iris_facts.json, or FALLBACK_KB_PATH) is compiled once
+into a TF-IDF inverted index. A question is scored only against the facts that share a term
+with it, so answering costs a few dictionary lookups even when every request is degraded.
+"""
+
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+
+DEFAULT_KB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'iris_facts.json')
+FALLBACK_KB_PATH = os.environ.get('FALLBACK_KB_PATH') or DEFAULT_KB_PATH
+
+# Keywords say what a fact is about, so they count more than words in the answer text
+KEYWORD_WEIGHT = 3
+# Below this cosine similarity a fact isn't considered an answer
+MIN_SCORE = 0.08
+
+# Words that don't say what is being asked; 'iris' is in every fact
+_STOP_WORDS = {
+    'a', 'an', 'the', 'please', 'can', 'could', 'would', 'you', 'tell', 'me', 'explain',
+    'describe', 'i', 'want', 'to', 'know', 'hi', 'hello', 'hey', 'thanks', 'what', 'who',
+    'is', 'are', 'was', 'were', 'be', 'how', 'do', 'does', 'did', 'of', 'in', 'on', 'for',
+    'and', 'or', 'about', 'it', 'its', 'they', 'them', 'their', 'this', 'that', 'these',
+    'those', 'with', 'why', 'there', 'any', 'some', 'my', 'your', 'at', 'by', 'from', 'as',
+    'iris', 'irises',
+}
+_WORD = re.compile(r'\w+')
+
+
+def _stem(word):
+    # Just enough to match plurals and verb forms (petals/petal, growing/grow)
+    for suffix in ('ing', 'ed'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    if word.endswith('s') and not word.endswith('ss') and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+    return [_stem(w) for w in _WORD.findall(text) if w not in _STOP_WORDS]
+
+
+def load_facts(path=FALLBACK_KB_PATH):
+    """Read a knowledge base: a JSON list of {"topic", "keywords", "answer"}"""
+    with open(path, encoding='utf-8') as f:
+        facts = json.load(f)
+    if not isinstance(facts, list) or not all(isinstance(f, dict) and f.get('answer') for f in facts):
+        raise ValueError(f"{path} must be a JSON list of objects with an 'answer'")
+    return facts
+
+
+class FallbackIndex:
+    """TF-IDF index over a list of facts, built once"""
+
+    def __init__(self, facts):
+        self.facts = list(facts)
+        doc_terms = []
+        for fact in self.facts:
+            terms = Counter(tokenize(fact['answer']))
+            for phrase in [fact.get('topic', '')] + list(fact.get('keywords', ())):
+                for term in tokenize(phrase):
+                    terms[term] += KEYWORD_WEIGHT
+            doc_terms.append(terms)
+
+        n = len(doc_terms)
+        document_frequency = Counter(term for terms in doc_terms for term in terms)
+        self.idf = {term: math.log((1 + n) / (1 + df)) + 1 for term, df in document_frequency.items()}
+
+        # term -> [(fact index, normalized weight)]
+        self.postings = {}
+        for i, terms in enumerate(doc_terms):
+            weights = {term: (1 + math.log(tf)) * self.idf[term] for term, tf in terms.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term, weight in weights.items():
+                self.postings.setdefault(term, []).append((i, weight / norm))
+
+    def search(self, question, limit=3, min_score=MIN_SCORE):
+        """Rank facts by cosine similarity to the question; returns [(score, fact)]"""
+        terms = Counter(tokenize(question))
+        weights = {term: (1 + math.log(tf)) * self.idf[term] for term, tf in terms.items() if term in self.idf}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        if not norm:
+            return []
+
+        scores = {}
+        for term, weight in weights.items():
+            for i, doc_weight in self.postings[term]:
+                scores[i] = scores.get(i, 0.0) + weight * doc_weight / norm
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [(score, self.facts[i]) for i, score in ranked[:limit] if score >= min_score]
+
+    def answer(self, question):
+        """The best matching answer text, or None if nothing in the knowledge base fits"""
+        results = self.search(question, limit=1)
+        return results[0][1]['answer'] if results else None
+
+    def __len__(self):
+        return len(self.facts)
+
+
+def create_fallback_index(path=FALLBACK_KB_PATH):
+    """Build the index from FALLBACK_KB_PATH, or an empty one if it can't be read"""
+    try:
+        return FallbackIndex(load_facts(path))
+    except (OSError, ValueError) as e:
+        print(f"Could not load fallback knowledge base {path}: {str(e)}")
+        return FallbackIndex([])
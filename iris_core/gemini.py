@@ -0,0 +1,103 @@
+"""
+Lazy Gemini model.
+Importing the app no longer configures the client or calls the API. The model is built
+on first use, and the "Hello" connectivity test runs in a background thread whose result
+is reported through /health instead of blocking worker startup.
+"""
+
+import os
+import threading
+import time
+
+GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-2.0-flash')
+
+# background: probe the API in a thread after import (default)
+# off:        fast start, never probe; the first /ask finds out
+# blocking:   old behaviour, probe during import
+GEMINI_STARTUP_PROBE = os.environ.get('GEMINI_STARTUP_PROBE', 'background')
+
+
+class PlaceholderModel:
+    """Stands in for the model when it can't be initialized"""
+
+    def generate_content(self, prompt, **kwargs):
+        class PlaceholderResponse:
+            text = "Sorry, the AI model is currently unavailable. Please try again later."
+        return PlaceholderResponse()
+
+
+class LazyModel:
+    """Drop-in for genai.GenerativeModel that initializes itself on first use"""
+
+    def __init__(self, api_key, model_name=GEMINI_MODEL):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.status = 'not_initialized'  # -> initializing -> probing -> ready / degraded / unavailable
+        self.error = None
+        self.checked_at = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _init(self):
+        with self._lock:
+            if self._model is not None:
+                return self._model
+            self.status = 'initializing'
+            try:
+                # Imported here: the SDK alone takes most of a second to load
+                import google.generativeai as genai
+
+                genai.configure(api_key=self.api_key)
+                self._model = genai.GenerativeModel(self.model_name)
+                self.status = 'initialized'
+                print(f"Successfully initialized {self.model_name} model")
+            except Exception as e:
+                print(f"Error initializing Gemini model: {str(e)}")
+                self.status = 'unavailable'
+                self.error = str(e)
+                self._model = PlaceholderModel()
+            return self._model
+
+    def get(self):
+        """Return the underlying model, building it if needed"""
+        return self._model if self._model is not None else self._init()
+
+    def generate_content(self, *args, **kwargs):
+        return self.get().generate_content(*args, **kwargs)
+
+    def probe(self):
+        """Test the model with a simple prompt and record whether it worked"""
+        model = self.get()
+        if isinstance(model, PlaceholderModel):
+            return False
+        self.status = 'probing'
+        try:
+            model.generate_content("Hello")
+            self.status = 'ready'
+            self.error = None
+            print("Model test successful")
+            return True
+        except Exception as e:
+            self.status = 'degraded'
+            self.error = str(e)
+            print(f"Model test failed: {str(e)}")
+            return False
+        finally:
+            self.checked_at = time.time()
+
+    def start(self, mode=GEMINI_STARTUP_PROBE):
+        """Kick off the startup probe according to mode"""
+        if mode == 'blocking':
+            self.probe()
+        elif mode == 'background':
+            threading.Thread(target=self.probe, name='gemini-probe', daemon=True).start()
+        return self
+
+    def health(self):
+        return {
+            'model': self.model_name,
+            'status': self.status,
+            'ready': self.status == 'ready',
+            'error': self.error,
+            'checked_at': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.checked_at)) if self.checked_at else None,
+        }
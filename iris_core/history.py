@@ -0,0 +1,232 @@
+"""
+Server-side prediction history.
+The session cookie only carries an opaque session id; the entries themselves live here,
+so cookie size and signing cost stay constant no matter how many predictions a user makes.
+"""
+
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Retention limits
+HISTORY_MAX_ENTRIES = int(os.environ.get('HISTORY_MAX_ENTRIES', 1000))  # per session
+HISTORY_RETENTION_DAYS = int(os.environ.get('HISTORY_RETENTION_DAYS', 30))
+HISTORY_MAX_SESSIONS = int(os.environ.get('HISTORY_MAX_SESSIONS', 10000))  # in-memory backend only
+
+
+def new_session_id():
+    """Generate an opaque, unguessable session id"""
+    return secrets.token_urlsafe(18)
+
+
+def make_entry(measurements, prediction, timestamp=None):
+    """Build a history entry in the shape the templates and export expect"""
+    return {
+        'measurements': measurements,
+        'prediction': prediction,
+        'timestamp': timestamp or datetime.now().strftime(TIMESTAMP_FORMAT)
+    }
+
+
+class HistoryStore:
+    """Base class for history backends"""
+
+    def __init__(self, max_entries=HISTORY_MAX_ENTRIES, retention_days=HISTORY_RETENTION_DAYS):
+        self.max_entries = max_entries
+        self.retention_days = retention_days
+
+    def _cutoff(self):
+        return (datetime.now() - timedelta(days=self.retention_days)).strftime(TIMESTAMP_FORMAT)
+
+    def add(self, session_id, entry):
+        raise NotImplementedError
+
+    def count(self, session_id):
+        raise NotImplementedError
+
+    def page(self, session_id, offset=0, limit=50):
+        """Return up to `limit` entries, newest first, skipping the newest `offset`"""
+        raise NotImplementedError
+
+    def iter_entries(self, session_id, start=None, end=None):
+        """Yield retained entries oldest first, optionally limited to timestamps in [start, end]"""
+        raise NotImplementedError
+
+    def clear(self, session_id):
+        raise NotImplementedError
+
+
+class MemoryHistoryStore(HistoryStore):
+    """Process-local history; bounded per session and in the number of sessions kept"""
+
+    def __init__(self, max_sessions=HISTORY_MAX_SESSIONS, **kwargs):
+        super().__init__(**kwargs)
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session id -> deque of entries, least recently used first
+        self._lock = threading.Lock()
+
+    def _entries(self, session_id):
+        # Caller holds the lock
+        entries = self._sessions.get(session_id)
+        if entries is None:
+            return None
+        self._sessions.move_to_end(session_id)
+        cutoff = self._cutoff()
+        while entries and entries[0]['timestamp'] < cutoff:
+            entries.popleft()
+        return entries
+
+    def add(self, session_id, entry):
+        with self._lock:
+            entries = self._entries(session_id)
+            if entries is None:
+                entries = self._sessions[session_id] = deque(maxlen=self.max_entries)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            entries.append(entry)
+
+    def count(self, session_id):
+        with self._lock:
+            entries = self._entries(session_id)
+            return len(entries) if entries else 0
+
+    def page(self, session_id, offset=0, limit=50):
+        with self._lock:
+            entries = self._entries(session_id)
+            if not entries:
+                return []
+            end = len(entries) - offset
+            return [entries[i] for i in range(end - 1, max(end - limit, 0) - 1, -1)]
+
+    def iter_entries(self, session_id, start=None, end=None):
+        with self._lock:
+            entries = [
+                entry for entry in self._entries(session_id) or ()
+                if (start is None or entry['timestamp'] >= start) and (end is None or entry['timestamp'] <= end)
+            ]
+        return iter(entries)
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """History shared by all worker processes through a single SQLite file"""
+
+    # Expired rows are swept at most this often (seconds)
+    PRUNE_INTERVAL = 3600
+
+    # Rows fetched per query when iterating a whole history
+    PAGE_SIZE = 500
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._local = threading.local()
+        self._last_prune = 0
+        conn = self._conn()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    sl REAL, sw REAL, pl REAL, pw REAL,
+                    prediction TEXT NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS history_session ON history (session_id, id)")
+
+    def _conn(self):
+        # One connection per thread; WAL lets readers and the writer proceed concurrently
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_entry(row):
+        timestamp, sl, sw, pl, pw, prediction = row
+        return make_entry({'sl': sl, 'sw': sw, 'pl': pl, 'pw': pw}, prediction, timestamp)
+
+    def add(self, session_id, entry):
+        m = entry['measurements']
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO history (session_id, timestamp, sl, sw, pl, pw, prediction) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, entry['timestamp'], m['sl'], m['sw'], m['pl'], m['pw'], entry['prediction']))
+            # Trim the session to its newest max_entries rows
+            conn.execute(
+                "DELETE FROM history WHERE session_id = ? AND id <= ("
+                "SELECT id FROM history WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (session_id, session_id, self.max_entries))
+        self._maybe_prune()
+
+    def _maybe_prune(self):
+        now = time.monotonic()
+        if now - self._last_prune < self.PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM history WHERE timestamp < ?", (self._cutoff(),))
+
+    def count(self, session_id):
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM history WHERE session_id = ? AND timestamp >= ?",
+            (session_id, self._cutoff())).fetchone()
+        return row[0]
+
+    def page(self, session_id, offset=0, limit=50):
+        rows = self._conn().execute(
+            "SELECT timestamp, sl, sw, pl, pw, prediction FROM history "
+            "WHERE session_id = ? AND timestamp >= ? ORDER BY id DESC LIMIT ? OFFSET ?",
+            (session_id, self._cutoff(), limit, offset)).fetchall()
+        return [self._row_to_entry(row) for row in rows]
+
+    def iter_entries(self, session_id, start=None, end=None):
+        # Keyset pagination: each page is a short query, so no read transaction
+        # is held open while a slow client downloads the export
+        start = max(start or '', self._cutoff())
+        end = end or '9999'
+        last_id = 0
+        while True:
+            rows = self._conn().execute(
+                "SELECT id, timestamp, sl, sw, pl, pw, prediction FROM history "
+                "WHERE session_id = ? AND id > ? AND timestamp >= ? AND timestamp <= ? ORDER BY id LIMIT ?",
+                (session_id, last_id, start, end, self.PAGE_SIZE)).fetchall()
+            for row in rows:
+                yield self._row_to_entry(row[1:])
+            if len(rows) < self.PAGE_SIZE:
+                return
+            last_id = rows[-1][0]
+
+    def clear(self, session_id):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM history WHERE session_id = ?", (session_id,))
+
+
+def create_history_store(backend=None):
+    """Create the history backend named by HISTORY_BACKEND ('sqlite' or 'memory')"""
+    backend = backend or os.environ.get('HISTORY_BACKEND', 'sqlite')
+    if backend == 'memory':
+        return MemoryHistoryStore()
+    if backend == 'sqlite':
+        path = os.environ.get('HISTORY_DB_PATH', 'history.db')
+        try:
+            return SQLiteHistoryStore(path)
+        except sqlite3.Error as e:
+            print(f"Could not open history database {path}: {str(e)} - falling back to in-memory history")
+            return MemoryHistoryStore()
+    raise ValueError(f"Unknown HISTORY_BACKEND '{backend}'. Use 'sqlite' or 'memory'.")
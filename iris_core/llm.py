@@ -0,0 +1,288 @@
+"""
+Bounded execution for Gemini calls.
+Model calls run on a small thread pool with a per-call deadline and a cap on how many
+calls may be queued or running at once, so a slow upstream can't tie up every request
+thread and starve the classifier routes. An optional circuit breaker stops calling the
+model altogether while it keeps failing, and derives the deadline from recent latencies.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+LLM_POOL_SIZE = int(os.environ.get('LLM_POOL_SIZE', 4))  # concurrent Gemini calls per worker
+LLM_MAX_QUEUE = int(os.environ.get('LLM_MAX_QUEUE', 16))  # running + waiting calls per worker
+LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 20))  # seconds; upper bound for adaptive deadlines
+
+# Circuit breaker: open when at least half of the last 20 calls (and 5 or more) failed
+LLM_BREAKER_WINDOW = int(os.environ.get('LLM_BREAKER_WINDOW', 20))
+LLM_BREAKER_MIN_CALLS = int(os.environ.get('LLM_BREAKER_MIN_CALLS', 5))
+LLM_BREAKER_FAILURE_RATE = float(os.environ.get('LLM_BREAKER_FAILURE_RATE', 0.5))
+LLM_BREAKER_COOLDOWN = float(os.environ.get('LLM_BREAKER_COOLDOWN', 30))  # seconds open before a probe call
+# Adaptive deadline: the 99th percentile of recent call latency times 2, within [LLM_TIMEOUT_MIN, LLM_TIMEOUT]
+LLM_TIMEOUT_MIN = float(os.environ.get('LLM_TIMEOUT_MIN', 3))
+LLM_TIMEOUT_PERCENTILE = float(os.environ.get('LLM_TIMEOUT_PERCENTILE', 99))
+LLM_TIMEOUT_MULTIPLIER = float(os.environ.get('LLM_TIMEOUT_MULTIPLIER', 2))
+
+
+class LLMBusyError(Exception):
+    """Raised when too many model calls are already queued"""
+
+
+class LLMTimeoutError(Exception):
+    """Raised when a model call doesn't finish before its deadline"""
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the model while the circuit is open"""
+
+
+class CircuitBreaker:
+    """Tracks the failure rate of model calls and stops calls while it is too high.
+
+    closed:    calls go through; outcomes are tracked over a rolling window
+    open:      calls fail immediately with CircuitOpenError until the cooldown passes
+    half_open: a single probe call is let through; success closes the circuit, failure reopens it
+    """
+
+    # Latency samples needed before the deadline adapts
+    MIN_LATENCY_SAMPLES = 10
+
+    def __init__(self, window=LLM_BREAKER_WINDOW, min_calls=LLM_BREAKER_MIN_CALLS,
+                 failure_rate=LLM_BREAKER_FAILURE_RATE, cooldown=LLM_BREAKER_COOLDOWN, half_open_calls=1,
+                 timeout=LLM_TIMEOUT, min_timeout=LLM_TIMEOUT_MIN, percentile=LLM_TIMEOUT_PERCENTILE,
+                 timeout_multiplier=LLM_TIMEOUT_MULTIPLIER, latency_window=100):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self.half_open_calls = half_open_calls
+        self.timeout = timeout
+        self.min_timeout = min(min_timeout, timeout)
+        self.percentile = percentile
+        self.timeout_multiplier = timeout_multiplier
+        self.state = 'closed'
+        self.opened_at = None
+        self.rejected = 0
+        self._outcomes = deque(maxlen=window)  # True for success
+        self._latencies = deque(maxlen=latency_window)
+        self._deadline = timeout
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def allows_calls(self):
+        """False while the circuit is open and the cooldown hasn't passed (doesn't reserve a probe)"""
+        return not (self.state == 'open' and time.monotonic() - self.opened_at < self.cooldown)
+
+    def before_call(self):
+        """Reserve permission for a call or raise CircuitOpenError"""
+        with self._lock:
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    self.rejected += 1
+                    raise CircuitOpenError("AI service is unavailable (circuit open)")
+                self.state = 'half_open'
+                self._probes = 0
+            if self.state == 'half_open':
+                if self._probes >= self.half_open_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError("AI service is unavailable (waiting for a probe call)")
+                self._probes += 1
+
+    def abandon(self):
+        """Give back a permission that wasn't used for a call"""
+        with self._lock:
+            if self.state == 'half_open' and self._probes:
+                self._probes -= 1
+
+    def record_success(self, latency=None):
+        with self._lock:
+            self._add_latency(latency)
+            if self.state != 'closed':
+                print("AI circuit closed: probe call succeeded")
+                self.state = 'closed'
+                self._outcomes.clear()
+                self._probes = 0
+            else:
+                self._outcomes.append(True)
+
+    def record_failure(self, latency=None):
+        with self._lock:
+            self._add_latency(latency)
+            if self.state == 'half_open':
+                self._open("probe call failed")
+                return
+            if self.state == 'open':
+                return  # a call started before the circuit opened
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+                self._open(f"{failures} of the last {len(self._outcomes)} calls failed")
+
+    def _open(self, reason):
+        # Caller holds the lock
+        print(f"AI circuit opened for {self.cooldown:g}s: {reason}")
+        self.state = 'open'
+        self.opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._probes = 0
+
+    def _add_latency(self, latency):
+        # Caller holds the lock
+        if latency is None:
+            return
+        self._latencies.append(latency)
+        if len(self._latencies) < self.MIN_LATENCY_SAMPLES:
+            return
+        ordered = sorted(self._latencies)
+        observed = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+        self._deadline = min(self.timeout, max(self.min_timeout, observed * self.timeout_multiplier))
+
+    def deadline(self):
+        """Seconds to wait for the next call"""
+        return self._deadline
+
+    def snapshot(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                'state': self.state,
+                'failure_rate': round(self._outcomes.count(False) / calls, 3) if calls else 0.0,
+                'deadline_seconds': round(self._deadline, 3),
+                'rejected_calls': self.rejected,
+            }
+
+
+class LLMCallPool:
+    """Thread pool for model calls with a deadline and a queue-depth limit"""
+
+    def __init__(self, size=LLM_POOL_SIZE, max_queue=LLM_MAX_QUEUE, timeout=LLM_TIMEOUT, breaker=None):
+        self.size = size
+        self.max_queue = max(size, max_queue)
+        self.timeout = timeout
+        self.breaker = breaker
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def _get_executor(self):
+        # Created on first use so forked gunicorn workers each get their own threads
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='llm')
+        return self._executor
+
+    def _release(self, _future):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue a call, returning a Future. Raises LLMBusyError if the queue is full."""
+        if not self._slots.acquire(blocking=False):
+            raise LLMBusyError(f"Too many AI requests in progress (limit {self.max_queue})")
+        with self._lock:
+            self.in_flight += 1
+        try:
+            future = self._get_executor().submit(fn, *args, **kwargs)
+        except Exception:
+            self._release(None)
+            raise
+        # The slot is held until the call really finishes, even if the caller gave up on it
+        future.add_done_callback(self._release)
+        return future
+
+    def call(self, fn, *args, timeout=None, reserved=False, **kwargs):
+        """Run fn on the pool and wait for it, raising LLMTimeoutError after the deadline.
+        With a breaker, raises CircuitOpenError right away while the circuit is open, unless
+        reserved says the caller already holds a permission from breaker.before_call()."""
+        breaker = self.breaker
+        if breaker is not None:
+            if not reserved:
+                breaker.before_call()
+            if timeout is None:
+                timeout = breaker.deadline()
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        try:
+            future = self.submit(fn, *args, **kwargs)
+        except LLMBusyError:
+            if breaker is not None:
+                breaker.abandon()
+            raise
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Drops the call if it hasn't started yet; a running call is abandoned
+            future.cancel()
+            if breaker is not None:
+                # Counting the deadline as a latency sample lets it grow when the upstream slows down
+                breaker.record_failure(latency=timeout)
+            raise LLMTimeoutError(f"AI request timed out after {timeout:g}s")
+        except Exception:
+            if breaker is not None:
+                breaker.record_failure()
+            raise
+        if breaker is not None:
+            breaker.record_success(latency=time.monotonic() - start)
+        return result
+
+    def stream(self, fn, *args, timeout=None, reserved=False, **kwargs):
+        """Run a streaming call on the pool and yield its items as they arrive.
+        Each item, including the first, must arrive within the deadline. Streams count
+        towards the breaker's failure rate but not its latency samples. reserved is as for call()."""
+        breaker = self.breaker
+        timeout = self.timeout if timeout is None else timeout
+        items = queue.Queue()
+        stopped = threading.Event()
+
+        def produce():
+            try:
+                result = fn(*args, **kwargs)
+                for item in (result if hasattr(result, '__iter__') else [result]):
+                    if stopped.is_set():
+                        return
+                    items.put((True, item))
+            except Exception as e:
+                items.put((False, e))
+                return
+            items.put((False, None))
+
+        if breaker is not None and not reserved:
+            breaker.before_call()
+        try:
+            self.submit(produce)
+        except LLMBusyError:
+            if breaker is not None:
+                breaker.abandon()
+            raise
+        recorded = False
+        try:
+            while True:
+                try:
+                    ok, item = items.get(timeout=timeout)
+                except queue.Empty:
+                    raise LLMTimeoutError(f"AI request timed out after {timeout:g}s")
+                if ok:
+                    yield item
+                elif item is None:
+                    if breaker is not None:
+                        breaker.record_success()
+                    recorded = True
+                    return
+                else:
+                    raise item
+        except Exception:
+            if breaker is not None:
+                breaker.record_failure()
+            recorded = True
+            raise
+        finally:
+            if not recorded and breaker is not None:
+                breaker.abandon()  # the client went away; says nothing about the upstream
+            # Client went away or we timed out: stop pulling from the upstream stream
+            stopped.set()
@@ -0,0 +1,288 @@
+"""
+Prometheus-style metrics.
+
+Counters, gauges and histograms are kept in process memory and cheap to update. When
+METRICS_DIR is set (gunicorn.conf.py sets it for every worker) each process periodically
+writes a snapshot there, and /metrics merges the snapshots of all workers so the totals
+are correct no matter which worker serves the scrape.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))  # seconds
+
+# Latency buckets in seconds: sub-millisecond classifier routes up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_registry = {}
+_collectors = []  # callbacks that refresh gauges just before a snapshot is taken
+_lock = threading.Lock()
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # tuple of label values -> value
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def snapshot(self):
+        with _lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Per-process value; summed across live worker processes"""
+
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket, then +Inf, sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def time(self, **labels):
+        """Context manager that observes the elapsed time of its block"""
+        return _Timer(self, labels)
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def _register(metric):
+    with _lock:
+        existing = _registry.get(metric.name)
+        if existing is not None:
+            return existing
+        _registry[metric.name] = metric
+    return metric
+
+
+def counter(name, documentation, labelnames=()):
+    return _register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return _register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+
+def on_collect(fn):
+    """Register a callback run before every snapshot, e.g. to set gauges from live objects"""
+    _collectors.append(fn)
+    return fn
+
+
+# Multi-process aggregation
+
+_last_flush = 0.0
+
+
+def _snapshot():
+    for fn in _collectors:
+        try:
+            fn()
+        except Exception as e:
+            print(f"Metrics collector failed: {str(e)}")
+    return {
+        'pid': os.getpid(),
+        'metrics': {
+            name: {
+                'type': metric.type,
+                'help': metric.documentation,
+                'labels': list(metric.labelnames),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'samples': metric.snapshot(),
+            }
+            for name, metric in list(_registry.items())
+        }
+    }
+
+
+_flusher_pid = None
+
+
+def _start_flusher():
+    """Background thread that keeps this process's snapshot fresh even when it goes idle"""
+    global _flusher_pid
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+
+    def run():
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            flush(force=True)
+
+    threading.Thread(target=run, name='metrics-flush', daemon=True).start()
+
+
+def flush(force=False):
+    """Write this process's snapshot to METRICS_DIR (at most every METRICS_FLUSH_INTERVAL seconds)"""
+    global _last_flush
+    if not METRICS_DIR:
+        return
+    _start_flusher()
+    now = time.monotonic()
+    if not force and now - _last_flush < METRICS_FLUSH_INTERVAL:
+        return
+    _last_flush = now
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f'metrics_{os.getpid()}.json')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(_snapshot(), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not write metrics snapshot: {str(e)}")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _load_snapshots():
+    if not METRICS_DIR:
+        return [_snapshot()]
+    flush(force=True)
+    snapshots = []
+    for filename in os.listdir(METRICS_DIR):
+        if not (filename.startswith('metrics_') and filename.endswith('.json')):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, filename)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # being replaced right now; picked up on the next scrape
+    return snapshots
+
+
+def collect():
+    """Merge every process's snapshot into {name: metric description with summed samples}"""
+    merged = {}
+    for snapshot in _load_snapshots():
+        alive = snapshot['pid'] == os.getpid() or _pid_alive(snapshot['pid'])
+        for name, metric in snapshot['metrics'].items():
+            # Counters and histograms from exited workers still count; their gauges don't
+            if metric['type'] == 'gauge' and not alive:
+                continue
+            target = merged.setdefault(name, dict(metric, samples={}))
+            for labels, value in metric['samples']:
+                key = tuple(labels)
+                if metric['type'] == 'histogram':
+                    current = target['samples'].get(key)
+                    target['samples'][key] = value if current is None else [a + b for a, b in zip(current, value)]
+                else:
+                    target['samples'][key] = target['samples'].get(key, 0) + value
+    return merged
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    """Render all metrics, aggregated across workers, in the Prometheus text format"""
+    lines = []
+    for name, metric in sorted(collect().items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for key, value in sorted(metric['samples'].items()):
+            if metric['type'] == 'histogram':
+                cumulative = 0
+                for bound, count in zip(metric['buckets'] + ['+Inf'], value[:-1]):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _format_value(float(bound))
+                    lines.append(f"{name}_bucket{_format_labels(metric['labels'], key, ('le', le))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(metric['labels'], key)} {_format_value(float(value[-1]))}")
+                lines.append(f"{name}_count{_format_labels(metric['labels'], key)} {cumulative}")
+            else:
+                lines.append(f"{name}{_format_labels(metric['labels'], key)} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+def clear_dir(path=METRICS_DIR):
+    """Remove snapshots left by a previous run (called once when gunicorn starts)"""
+    if not path or not os.path.isdir(path):
+        return
+    for filename in os.listdir(path):
+        if filename.startswith('metrics_'):
+            try:
+                os.remove(os.path.join(path, filename))
+            except OSError:
+                pass
+
+
+atexit.register(flush, force=True)
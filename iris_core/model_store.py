@@ -0,0 +1,209 @@
+"""
+Versioned classifier artifacts, and hot reload of the live one.
+
+    MODEL_DIR/
+        CURRENT                    name of the live version (replaced atomically)
+        20261018T120000-1a2b3c4d/  one directory per trained model
+            model.json             kind, parameters and training metrics
+            *.npy                  the model's arrays, memory-mapped when loaded
+
+train_model.py writes a new version and then points CURRENT at it. A ModelWatcher thread in
+each worker notices the change within MODEL_RELOAD_INTERVAL seconds. It loads and warms the new
+engine off the request path, then swaps it into the classifier registry. Requests already
+running finish with the engine they started with.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from iris_core.assets import ROOT
+from iris_core.classifier import (DecisionTableEngine, GaussianEngine, TreeEngine, register_engine, get_engine, FIELDS,
+                                  TRAINED_ENGINE)
+
+MODEL_DIR = os.environ.get('MODEL_DIR') or os.path.join(ROOT, 'models')
+MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', 5))  # seconds; 0 turns reloading off
+POINTER_NAME = 'CURRENT'
+# Name the trained model is registered under; it becomes the default unless CLASSIFIER_ENGINE says otherwise
+ENGINE_NAME = TRAINED_ENGINE
+FORMAT_VERSION = 1
+
+
+def _arrays(engine):
+    if isinstance(engine, DecisionTableEngine):
+        return 'threshold', {'thresholds': engine.thresholds}, {'feature': int(engine.feature)}
+    if isinstance(engine, GaussianEngine):
+        return 'gaussian', {name: getattr(engine, name) for name in ('means', 'covariances', 'priors')}, {}
+    if isinstance(engine, TreeEngine):
+        arrays = {name: getattr(engine, name) for name in ('feature', 'threshold', 'left', 'right', 'counts')}
+        return 'tree', arrays, {}
+    raise ValueError(f"Can't save a {type(engine).__name__}")
+
+
+def save_model(engine, metadata=None, model_dir=MODEL_DIR, activate=True):
+    """Write engine as a new version and (by default) make it the live one; returns the version"""
+    kind, arrays, params = _arrays(engine)
+    digest = hashlib.sha256()
+    for name in sorted(arrays):
+        digest.update(name.encode('utf-8') + np.ascontiguousarray(arrays[name]).tobytes())
+    version = time.strftime('%Y%m%dT%H%M%S') + '-' + digest.hexdigest()[:8]
+
+    # Written under a temporary name and renamed, so a half-written version is never visible
+    os.makedirs(model_dir, exist_ok=True)
+    staging = os.path.join(model_dir, f'.{version}.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name, array in arrays.items():
+        np.save(os.path.join(staging, name + '.npy'), np.ascontiguousarray(array))
+    info = dict(metadata or {}, kind=kind, params=dict((metadata or {}).get('params', {}), **params),
+                arrays=sorted(arrays), fields=list(FIELDS), version=version,
+                format=FORMAT_VERSION, created=time.strftime('%Y-%m-%d %H:%M:%S'))
+    with open(os.path.join(staging, 'model.json'), 'w') as f:
+        json.dump(info, f, indent=2, sort_keys=True)
+    if os.path.isdir(os.path.join(model_dir, version)):
+        shutil.rmtree(staging)  # the same model, saved again within the second
+    else:
+        os.replace(staging, os.path.join(model_dir, version))
+
+    if activate:
+        activate_version(version, model_dir)
+    return version
+
+
+def activate_version(version, model_dir=MODEL_DIR):
+    """Point CURRENT at version (an atomic rename, so readers see the old or new name, never half)"""
+    if not os.path.isfile(os.path.join(model_dir, version, 'model.json')):
+        raise ValueError(f"No model version '{version}' in {model_dir}")
+    pointer = os.path.join(model_dir, POINTER_NAME)
+    temporary = f'{pointer}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as f:
+        f.write(version + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, pointer)
+
+
+def current_version(model_dir=MODEL_DIR):
+    try:
+        with open(os.path.join(model_dir, POINTER_NAME)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def list_versions(model_dir=MODEL_DIR):
+    """Saved versions, oldest first"""
+    try:
+        names = os.listdir(model_dir)
+    except OSError:
+        return []
+    return sorted(name for name in names if os.path.isfile(os.path.join(model_dir, name, 'model.json')))
+
+
+def prune_versions(keep=5, model_dir=MODEL_DIR):
+    """Delete all but the newest `keep` versions (never the live one). Workers that still have an
+    old version mapped keep reading it: the files only go away once they let go of them."""
+    live = current_version(model_dir)
+    removed = []
+    for version in list_versions(model_dir)[:-keep or None]:
+        if version != live:
+            shutil.rmtree(os.path.join(model_dir, version), ignore_errors=True)
+            removed.append(version)
+    return removed
+
+
+def load_version(version, model_dir=MODEL_DIR):
+    """Load a saved version as an engine, with its arrays memory-mapped read-only"""
+    path = os.path.join(model_dir, version)
+    with open(os.path.join(path, 'model.json')) as f:
+        info = json.load(f)
+    if info.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Model {version} has format {info.get('format')}, expected {FORMAT_VERSION}")
+    arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in info['arrays']}
+    if info['kind'] == 'threshold':
+        engine = DecisionTableEngine(thresholds=arrays['thresholds'], feature=info['params']['feature'])
+    elif info['kind'] == 'gaussian':
+        engine = GaussianEngine(**arrays)
+    elif info['kind'] == 'tree':
+        engine = TreeEngine(**arrays)
+    else:
+        raise ValueError(f"Unknown model kind '{info['kind']}'")
+    engine.name = ENGINE_NAME
+    engine.version = version
+    engine.info = info
+    return engine
+
+
+class ModelWatcher:
+    """Keeps the 'trained' engine in step with MODEL_DIR/CURRENT"""
+
+    def __init__(self, model_dir=MODEL_DIR, interval=MODEL_RELOAD_INTERVAL):
+        self.model_dir = model_dir
+        self.interval = interval
+        self.version = None
+        self.error = None
+        self._thread = None
+
+    def check(self):
+        """Load CURRENT if it has changed; returns True when a new engine was swapped in"""
+        version = current_version(self.model_dir)
+        if version is None or version == self.version:
+            return False
+        try:
+            engine = load_version(version, self.model_dir)
+            # Touch every page and code path now rather than on the first request that uses it
+            engine.predict_array(np.zeros((1, len(FIELDS))))
+        except Exception as e:
+            if version != self.error:
+                print(f"Could not load model {version}: {str(e)} - keeping the current engine")
+            self.error = version
+            return False
+        default = os.environ.get('CLASSIFIER_ENGINE', ENGINE_NAME) == ENGINE_NAME
+        register_engine(engine, ENGINE_NAME, default=default)
+        print(f"Loaded classifier model {version} ({engine.info['kind']})")
+        self.version = version
+        self.error = None
+        return True
+
+    def start(self):
+        """Load the live model now, then poll for new ones in the background"""
+        self.check()
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='model-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Model reload check failed: {str(e)}")
+
+    def status(self):
+        engine = get_engine(ENGINE_NAME) if self.version else None
+        return {
+            'version': self.version,
+            'kind': engine.info['kind'] if engine else None,
+            'cv_accuracy': engine.info.get('cv_accuracy') if engine else None,
+            'failed_version': self.error,
+        }
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def start_watcher(model_dir=MODEL_DIR):
+    """The process-wide watcher, started on first call"""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = ModelWatcher(model_dir).start()
+    return _watcher
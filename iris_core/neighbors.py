@@ -0,0 +1,181 @@
+"""
+The reference flowers closest to a measurement, shown as evidence for a prediction.
+
+The labelled flowers in data/iris.csv are indexed once, at import, in a k-d tree. A single
+row is looked up with a plain-Python walk of the tree, in well under a millisecond. A batch
+walks the tree once for all of its rows. At each node, rows whose k-th best distance already
+beats the node's bounding box drop out, so each row touches a few leaves instead of all 150
+flowers. Distances are Euclidean, in centimetres, over all four measurements.
+"""
+
+import heapq
+import os
+
+import numpy as np
+
+from iris_core.classifier import FIELDS, SPECIES, MAX_MEASUREMENT, check_measurements
+from iris_core.training import DEFAULT_DATASET, load_dataset
+
+DEFAULT_NEIGHBORS = int(os.environ.get('EXPLAIN_NEIGHBORS', 5))
+MAX_NEIGHBORS = 25
+LEAF_SIZE = 8
+
+
+class KDTree:
+    """A k-d tree over an (n, d) array of points, split at the median of the widest dimension"""
+
+    def __init__(self, points, leaf_size=LEAF_SIZE):
+        self.points = np.ascontiguousarray(points, dtype=np.float64)
+        if self.points.ndim != 2 or not len(self.points):
+            raise ValueError("A k-d tree needs a non-empty (n, d) array of points")
+        self.leaf_size = leaf_size
+        # Node arrays; a node covers order[start:end] and has left == -1 when it is a leaf
+        self.start, self.end, self.left, self.right = [], [], [], []
+        self.split_dim, self.split_value, self.mins, self.maxs = [], [], [], []
+        self.order = np.arange(len(self.points))
+        self._build(0, len(self.points))
+        self.start, self.end = np.array(self.start), np.array(self.end)
+        self.left, self.right = np.array(self.left), np.array(self.right)
+        self.split_dim, self.split_value = np.array(self.split_dim), np.array(self.split_value)
+        self.mins, self.maxs = np.array(self.mins), np.array(self.maxs)
+        # Leaf points stored in tree order, so a leaf is one contiguous slice
+        self.sorted_points = self.points[self.order]
+        # Plain-list copies for single-row queries, where per-call numpy overhead would dominate
+        self._nodes = list(zip(self.start.tolist(), self.end.tolist(), self.left.tolist(), self.right.tolist(),
+                               self.split_dim.tolist(), self.split_value.tolist(),
+                               self.mins.tolist(), self.maxs.tolist()))
+        self._leaf_points = list(zip(self.order.tolist(), self.sorted_points.tolist()))
+
+    def _build(self, start, end):
+        node = len(self.start)
+        box = self.points[self.order[start:end]]
+        self.start.append(start)
+        self.end.append(end)
+        self.mins.append(box.min(axis=0))
+        self.maxs.append(box.max(axis=0))
+        self.left.append(-1)
+        self.right.append(-1)
+        self.split_dim.append(-1)
+        self.split_value.append(0.0)
+        if end - start <= self.leaf_size:
+            return node
+
+        dim = int(np.argmax(self.maxs[node] - self.mins[node]))
+        middle = (start + end) // 2
+        section = self.order[start:end]
+        section[:] = section[np.argsort(self.points[section, dim], kind='stable')]
+        self.split_dim[node] = dim
+        self.split_value[node] = float(self.points[self.order[middle], dim])
+        self.left[node] = self._build(start, middle)
+        self.right[node] = self._build(middle, end)
+        return node
+
+    def query(self, X, k=DEFAULT_NEIGHBORS):
+        """(distances, indices), each (len(X), k) and nearest first, of the k nearest points to each row"""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        k = min(k, len(self.points))
+        if len(X) == 1:
+            return self._query_one(X[0].tolist(), k)
+        distances = np.full((len(X), k), np.inf)
+        indices = np.full((len(X), k), -1, dtype=np.intp)
+        if len(X):
+            self._visit(0, X, np.arange(len(X)), distances, indices)
+        return np.sqrt(distances), indices
+
+    def _query_one(self, x, k):
+        best = []  # max-heap of (-squared distance, -index) holding the k nearest so far
+        stack = [0]
+        while stack:
+            start, end, left, right, dim, value, mins, maxs = self._nodes[stack.pop()]
+            gap = 0.0
+            for xi, lo, hi in zip(x, mins, maxs):
+                # Products rather than ** 2: float64 overflow then gives inf instead of raising
+                if xi < lo:
+                    gap += (lo - xi) * (lo - xi)
+                elif xi > hi:
+                    gap += (xi - hi) * (xi - hi)
+            if len(best) == k and gap > -best[0][0]:
+                continue
+            if left < 0:
+                for index, point in self._leaf_points[start:end]:
+                    item = (-sum((a - b) * (a - b) for a, b in zip(x, point)), -index)
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+                continue
+            # Pushed far side first, so the near side is searched first
+            stack.extend((left, right) if x[dim] >= value else (right, left))
+        best.sort(reverse=True)
+        return (np.sqrt([[-d for d, _ in best]]), np.array([[-i for _, i in best]], dtype=np.intp))
+
+    def _visit(self, node, X, rows, distances, indices):
+        # Rows for which this node's box could still hold something as close as their k-th best
+        # (<= so that a row whose distances overflow to inf still reaches a leaf)
+        x = X[rows]
+        gap = np.maximum(self.mins[node] - x, 0) + np.maximum(x - self.maxs[node], 0)
+        rows = rows[np.einsum('ij,ij->i', gap, gap) <= distances[rows, -1]]
+        if not len(rows):
+            return
+
+        if self.left[node] < 0:
+            start, end = self.start[node], self.end[node]
+            x = X[rows]
+            diff = x[:, None, :] - self.sorted_points[start:end]
+            # This leaf's points go first, so on a tie (e.g. overflowed distances) they win over empty slots
+            candidates = np.concatenate([np.einsum('ijk,ijk->ij', diff, diff), distances[rows]], axis=1)
+            candidate_indices = np.concatenate(
+                [np.broadcast_to(self.order[start:end], (len(rows), end - start)), indices[rows]], axis=1)
+            best = np.argsort(candidates, axis=1, kind='stable')[:, :distances.shape[1]]
+            distances[rows] = np.take_along_axis(candidates, best, axis=1)
+            indices[rows] = np.take_along_axis(candidate_indices, best, axis=1)
+            return
+
+        # Near side first: rows left of the split visit left then right, the rest right then left
+        goes_left = X[rows, self.split_dim[node]] < self.split_value[node]
+        self._visit(self.left[node], X, rows[goes_left], distances, indices)
+        self._visit(self.right[node], X, rows, distances, indices)
+        self._visit(self.left[node], X, rows[~goes_left], distances, indices)
+
+
+class ReferenceSet:
+    """Labelled flowers with a k-d tree over their measurements"""
+
+    def __init__(self, X, y):
+        self.X = np.asarray(X, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.intp)
+        self.tree = KDTree(self.X)
+
+    @classmethod
+    def load(cls, path=DEFAULT_DATASET):
+        return cls(*load_dataset(path))
+
+    def nearest(self, X, k=DEFAULT_NEIGHBORS):
+        """For each row of X, a list of the k closest flowers:
+        {row (1-based position in the data file), sl, sw, pl, pw, species, distance}"""
+        distances, indices = self.tree.query(X, k)
+        results = []
+        for row_distances, row_indices in zip(np.round(distances, 4).tolist(), indices.tolist()):
+            results.append([
+                dict(zip(FIELDS, self.X[i].tolist()), row=i + 1, species=str(SPECIES[self.y[i]]), distance=d)
+                for d, i in zip(row_distances, row_indices)
+            ])
+        return results
+
+
+try:
+    reference_set = ReferenceSet.load()
+except (OSError, ValueError) as e:
+    print(f"Could not index the reference flowers: {str(e)}")
+    reference_set = None
+
+
+def nearest_flowers(X, k=DEFAULT_NEIGHBORS):
+    """The k reference flowers closest to each row of X (see ReferenceSet.nearest)"""
+    if reference_set is None:
+        raise ValueError("Nearest flowers are unavailable: the reference dataset couldn't be loaded")
+    if not 1 <= k <= MAX_NEIGHBORS:
+        raise ValueError(f"neighbors must be between 1 and {MAX_NEIGHBORS}")
+    X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+    check_measurements(X)  # beyond MAX_MEASUREMENT squared distances could overflow
+    return reference_set.nearest(X, k)
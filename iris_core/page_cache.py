@@ -0,0 +1,64 @@
+"""
+Render cache for pages whose only per-request value is a number.
+
+The page is rendered once with a placeholder number, split around it, and kept as bytes.
+Serving it is then a bytes join instead of a Jinja render and an encode. Pages that also change shape depending on
+the number (e.g. a disabled button at 0) keep one rendering per variant.
+"""
+
+import hashlib
+import threading
+
+# Stands in for the dynamic number while rendering; never shown to users
+PLACEHOLDER = 918273645
+
+
+class _Page:
+    def __init__(self, html):
+        body = html.encode('utf-8')
+        self.parts = body.split(str(PLACEHOLDER).encode('ascii'))
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+
+    def fill(self, value):
+        return str(value).encode('ascii').join(self.parts)
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header value matches etag (weak comparison, as for GET)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag.strip('"') == etag:
+            return True
+    return False
+
+
+class PageCache:
+    """Pre-rendered pages keyed by variant"""
+
+    def __init__(self):
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def get(self, variant, render):
+        """The cached page for variant; render(placeholder) builds it on first use"""
+        page = self._pages.get(variant)
+        if page is None:
+            page = _Page(render(PLACEHOLDER))
+            with self._lock:
+                page = self._pages.setdefault(variant, page)
+        return page
+
+    def render(self, variant, value, render):
+        """Return (body as UTF-8 bytes, unquoted etag) for variant with value filled in"""
+        page = self.get(variant, render)
+        return page.fill(value), f'{page.digest}-{value}'
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
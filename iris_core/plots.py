@@ -0,0 +1,216 @@
+"""
+Decision plots: where the classifier puts each species in the petal length/width plane, with
+the flower being classified marked on top.
+
+Nothing here needs matplotlib. The background is drawn once per engine: the decision regions
+come from a single predict_array call over every pixel, and the reference flowers are stamped
+on top. It is kept as an 8-bit palette image. Marking a flower means copying that array,
+stamping a disc and PNG-encoding it with zlib. The SVG version wraps the background PNG and
+only adds a circle. Finished images go into a bounded LRU keyed by the measurements rounded
+to PLOT_BUCKET cm, so repeat visitors cost a dictionary lookup.
+"""
+
+import base64
+import hashlib
+import math
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from iris_core.classifier import SPECIES, get_engine
+from iris_core.neighbors import reference_set
+
+PLOT_FORMAT = os.environ.get('PLOT_FORMAT', 'svg').lower()  # 'svg', 'png' or 'off'
+PLOT_CACHE_SIZE = int(os.environ.get('PLOT_CACHE_SIZE', 512))
+PLOT_BUCKET = 0.05  # cm; measurements are rounded to this before plotting, so nearby flowers share an image
+FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+# Measurements are clamped to this (cm) before bucketing; anything past the axes is drawn at the edge anyway
+PLOT_LIMIT = 100.0
+
+WIDTH, HEIGHT = 480, 320
+PETAL_LENGTH_RANGE = (0.5, 7.5)  # cm, x axis
+PETAL_WIDTH_RANGE = (0.0, 2.8)  # cm, y axis
+# Sepal measurements for the regions when there is no reference data to average
+DEFAULT_SEPALS = (5.84, 3.06)
+
+# Palette: 0 background, 1-3 species regions, 4-6 species flowers, 7 grid, 8-9 the marked flower
+PALETTE = np.array([
+    (26, 26, 26),
+    (16, 58, 64), (64, 18, 56), (46, 64, 18),
+    (0, 243, 255), (255, 60, 220), (190, 255, 40),
+    (70, 70, 70),
+    (255, 255, 255), (0, 0, 0),
+], dtype=np.uint8)
+REGION, FLOWER, GRID, MARKER_FILL, MARKER_EDGE = 1, 4, 7, 8, 9
+SPECIES_COLORS = ['#%02x%02x%02x' % tuple(PALETTE[FLOWER + i]) for i in range(len(SPECIES))]
+
+
+def _disc(radius):
+    dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    inside = dx * dx + dy * dy <= radius * radius + radius  # the + radius rounds off the edges
+    return dy[inside], dx[inside]
+
+
+_FLOWER_DISC = _disc(2)
+_MARKER_EDGE_DISC = _disc(7)
+_MARKER_FILL_DISC = _disc(5)
+
+
+def _stamp(image, x, y, disc, value):
+    dy, dx = disc
+    rows, columns = dy + y, dx + x
+    keep = (rows >= 0) & (rows < image.shape[0]) & (columns >= 0) & (columns < image.shape[1])
+    image[rows[keep], columns[keep]] = value
+
+
+def _to_pixels(pl, pw):
+    x = (np.asarray(pl) - PETAL_LENGTH_RANGE[0]) / (PETAL_LENGTH_RANGE[1] - PETAL_LENGTH_RANGE[0]) * WIDTH
+    y = (PETAL_WIDTH_RANGE[1] - np.asarray(pw)) / (PETAL_WIDTH_RANGE[1] - PETAL_WIDTH_RANGE[0]) * HEIGHT
+    return np.clip(np.floor(x), 0, WIDTH - 1).astype(int), np.clip(np.floor(y), 0, HEIGHT - 1).astype(int)
+
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+
+def encode_png(indexed, palette=PALETTE, level=6):
+    """PNG bytes for a 2-D uint8 array of palette indices"""
+    height, width = indexed.shape
+    raw = np.zeros((height, width + 1), dtype=np.uint8)  # each row starts with filter type 0
+    raw[:, 1:] = indexed
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)),
+        _png_chunk(b'PLTE', palette.tobytes()),
+        _png_chunk(b'IDAT', zlib.compress(raw.tobytes(), level)),
+        _png_chunk(b'IEND', b''),
+    ])
+
+
+class DecisionPlot:
+    """The pre-rendered background for one engine, and the marked images drawn from it"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        reference = reference_set
+        sepals = reference.X[:, :2].mean(axis=0) if reference is not None else DEFAULT_SEPALS
+
+        # Regions: classify the centre of every pixel, sepals held at the dataset average
+        pl = PETAL_LENGTH_RANGE[0] + (np.arange(WIDTH) + 0.5) * (PETAL_LENGTH_RANGE[1] - PETAL_LENGTH_RANGE[0]) / WIDTH
+        pw = PETAL_WIDTH_RANGE[1] - (np.arange(HEIGHT) + 0.5) * (PETAL_WIDTH_RANGE[1] - PETAL_WIDTH_RANGE[0]) / HEIGHT
+        grid_pl, grid_pw = np.meshgrid(pl, pw)
+        X = np.column_stack([np.full(grid_pl.size, sepals[0]), np.full(grid_pl.size, sepals[1]),
+                             grid_pl.ravel(), grid_pw.ravel()])
+        image = (engine.predict_array(X)[0].reshape(HEIGHT, WIDTH) + REGION).astype(np.uint8)
+
+        # Grid every centimetre of length and half centimetre of width
+        self.x_ticks = np.arange(np.ceil(PETAL_LENGTH_RANGE[0]), PETAL_LENGTH_RANGE[1], 1.0)
+        self.y_ticks = np.arange(np.ceil(PETAL_WIDTH_RANGE[0]), PETAL_WIDTH_RANGE[1], 0.5)
+        columns, rows = _to_pixels(self.x_ticks, self.y_ticks)
+        image[:, columns] = GRID
+        image[rows, :] = GRID
+
+        if reference is not None:
+            for x, y, species in zip(*_to_pixels(reference.X[:, 2], reference.X[:, 3]), reference.y.tolist()):
+                _stamp(image, x, y, _FLOWER_DISC, FLOWER + species)
+
+        self.background = image
+        self.background_png = encode_png(image)
+        self.digest = hashlib.sha256(self.background_png).hexdigest()[:12]
+        self.sepals = tuple(float(s) for s in sepals)
+        self._svg_head = self._svg_prefix()
+
+    def png(self, pl, pw):
+        image = self.background.copy()
+        x, y = _to_pixels(pl, pw)
+        _stamp(image, x, y, _MARKER_EDGE_DISC, MARKER_EDGE)
+        _stamp(image, x, y, _MARKER_FILL_DISC, MARKER_FILL)
+        return encode_png(image)
+
+    def svg(self, pl, pw):
+        x, y = _to_pixels(pl, pw)
+        return (self._svg_head + f'<circle cx="{x + 40}" cy="{y + 10}" r="6" fill="#fff" stroke="#000" '
+                f'stroke-width="2"/></svg>').encode('utf-8')
+
+    def _svg_prefix(self):
+        # Everything but the marked flower: 40px left and 40px bottom margins for the axes
+        parts = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {WIDTH + 50} {HEIGHT + 70}" '
+            f'width="{WIDTH + 50}" height="{HEIGHT + 70}" font-family="sans-serif" font-size="11" fill="#ccc">',
+            f'<rect width="100%" height="100%" fill="#1a1a1a"/>',
+            f'<image x="40" y="10" width="{WIDTH}" height="{HEIGHT}" '
+            f'href="data:image/png;base64,{base64.b64encode(self.background_png).decode("ascii")}"/>',
+        ]
+        columns, rows = _to_pixels(self.x_ticks, self.y_ticks)
+        for value, x in zip(self.x_ticks.tolist(), columns.tolist()):
+            parts.append(f'<text x="{x + 40}" y="{HEIGHT + 24}" text-anchor="middle">{value:g}</text>')
+        for value, y in zip(self.y_ticks.tolist(), rows.tolist()):
+            parts.append(f'<text x="34" y="{y + 14}" text-anchor="end">{value:g}</text>')
+        parts.append(f'<text x="{40 + WIDTH // 2}" y="{HEIGHT + 40}" text-anchor="middle">Petal length (cm)</text>')
+        parts.append(f'<text transform="translate(12 {10 + HEIGHT // 2}) rotate(-90)" '
+                     f'text-anchor="middle">Petal width (cm)</text>')
+        for i, (name, color) in enumerate(zip(SPECIES.tolist(), SPECIES_COLORS)):
+            parts.append(f'<circle cx="{50 + i * 150}" cy="{HEIGHT + 58}" r="4" fill="{color}"/>'
+                         f'<text x="{58 + i * 150}" y="{HEIGHT + 62}">{name}</text>')
+        return ''.join(parts)
+
+
+class PlotRenderer:
+    """Marked decision plots in a bounded LRU, keyed by engine background, format and bucketed
+    petal measurements"""
+
+    def __init__(self, max_entries=PLOT_CACHE_SIZE, bucket=PLOT_BUCKET):
+        self.max_entries = max_entries
+        self.bucket = bucket
+        self.hits = 0
+        self.misses = 0
+        self._plot = None
+        self._entries = OrderedDict()  # key -> image bytes, least recently used first
+        self._lock = threading.Lock()
+
+    def quantize(self, value):
+        """value rounded to the bucket, as a short string for URLs and keys"""
+        value = float(value)
+        if not math.isfinite(value):
+            raise ValueError("Measurements must be finite numbers")
+        value = min(max(value, -PLOT_LIMIT), PLOT_LIMIT)
+        return f'{round(value / self.bucket) * self.bucket:.2f}'
+
+    def background(self, engine=None):
+        """The DecisionPlot for engine (the active one by default), redrawn when it changes"""
+        engine = engine or get_engine()
+        plot = self._plot
+        if plot is None or plot.engine is not engine:
+            plot = DecisionPlot(engine)
+            self._plot = plot
+        return plot
+
+    def render(self, output_format, pl, pw, engine=None):
+        """Return (image bytes, unquoted etag) for a flower with petal length pl and width pw"""
+        if output_format not in FORMATS:
+            raise ValueError(f"Unsupported plot format '{output_format}'. Use one of: {', '.join(FORMATS)}")
+        plot = self.background(engine)
+        pl, pw = self.quantize(pl), self.quantize(pw)
+        key = f'{plot.digest}-{output_format}-{pl}-{pw}'
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image, key
+            self.misses += 1
+
+        image = getattr(plot, output_format)(float(pl), float(pw))
+        with self._lock:
+            self._entries[key] = image
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return image, key
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,419 @@
+"""
+Opt-in sampling profiler for production traffic.
+
+A fraction of requests to the wrapped views (PROFILE_SAMPLE_RATE, or set at runtime through
+the admin routes) run under cProfile while a sampler thread records their call stacks, and
+optionally under tracemalloc for allocation stats. Settings are shared through PROFILE_DIR so
+a change reaches every gunicorn worker without a restart, and each worker periodically writes
+its data there so reports cover all of them. Stack samples are exported in the collapsed
+"frame;frame;frame count" format read by flamegraph.pl and speedscope.
+"""
+
+import cProfile
+import functools
+import json
+import linecache
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from io import StringIO
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR') or None
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))  # 0 = off, 1 = every request
+PROFILE_TRACEMALLOC = os.environ.get('PROFILE_TRACEMALLOC', '').lower() in ('1', 'true', 'yes')
+
+# How often the stack sampler looks at profiled threads (seconds)
+STACK_INTERVAL = 0.005
+# How often workers re-read shared settings and write their data (seconds)
+SYNC_INTERVAL = 2
+DUMP_INTERVAL = 10
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}"
+
+
+class Profiler:
+    def __init__(self, directory=PROFILE_DIR, sample_rate=PROFILE_SAMPLE_RATE, trace_allocations=PROFILE_TRACEMALLOC):
+        self.directory = directory
+        self.settings = {'sample_rate': sample_rate, 'tracemalloc': trace_allocations, 'generation': 0}
+        self._lock = threading.Lock()
+        self._cprofile_lock = threading.Lock()  # only one cProfile may run at a time
+        self._active = {}  # thread id -> endpoint being profiled
+        self._sampler_pid = None
+        self._last_sync = 0.0
+        self._last_dump = 0.0
+        self._settings_mtime = None
+        self._reset_data()
+        self._apply_tracemalloc()
+
+    def _reset_data(self):
+        self._stats = {}  # endpoint -> pstats.Stats
+        self._stacks = Counter()  # collapsed stack -> samples
+        self._samples = Counter()  # endpoint -> profiled requests
+        self._alloc_peaks = {}  # endpoint -> [requests, total peak bytes, max peak bytes]
+        self._dirty = False
+
+    # Settings, shared between workers through PROFILE_DIR
+
+    def _settings_path(self):
+        return os.path.join(self.directory, 'settings.json') if self.directory else None
+
+    def _apply_tracemalloc(self):
+        if self.settings['tracemalloc'] and not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+        elif not self.settings['tracemalloc'] and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _sync_settings(self, force=False):
+        path = self._settings_path()
+        now = time.monotonic()
+        if not path or (not force and now - self._last_sync < SYNC_INTERVAL):
+            return
+        self._last_sync = now
+        try:
+            mtime = os.path.getmtime(path)
+            if mtime == self._settings_mtime:
+                return
+            with open(path) as f:
+                settings = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._settings_mtime = mtime
+        with self._lock:
+            if settings.get('generation', 0) != self.settings['generation']:
+                self._reset_data()
+            self.settings.update(settings)
+        self._apply_tracemalloc()
+
+    def update_settings(self, sample_rate=None, trace_allocations=None, reset=False):
+        """Change settings for every worker; reset=True discards collected data"""
+        self._sync_settings(force=True)
+        with self._lock:
+            if sample_rate is not None:
+                self.settings['sample_rate'] = min(1.0, max(0.0, float(sample_rate)))
+            if trace_allocations is not None:
+                self.settings['tracemalloc'] = bool(trace_allocations)
+            if reset:
+                self.settings['generation'] += 1
+                self._reset_data()
+            settings = dict(self.settings)
+        self._apply_tracemalloc()
+
+        path = self._settings_path()
+        if path:
+            os.makedirs(self.directory, exist_ok=True)
+            if reset:
+                for filename in os.listdir(self.directory):
+                    if filename.startswith(('stacks_', 'cprofile_', 'alloc_')):
+                        try:
+                            os.remove(os.path.join(self.directory, filename))
+                        except OSError:
+                            pass
+            with open(path + '.tmp', 'w') as f:
+                json.dump(settings, f)
+            os.replace(path + '.tmp', path)
+            self._settings_mtime = os.path.getmtime(path)
+        return settings
+
+    # Sampling
+
+    def profile(self, endpoint):
+        """Decorator: profile a sampled fraction of calls to a view"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                self._sync_settings()
+                rate = self.settings['sample_rate']
+                if rate <= 0 or random.random() >= rate:
+                    return fn(*args, **kwargs)
+                return self._run_profiled(endpoint, fn, args, kwargs)
+            return wrapper
+        return decorator
+
+    def _ensure_sampler(self):
+        with self._lock:
+            if self._sampler_pid == os.getpid():
+                return
+            self._sampler_pid = os.getpid()
+        threading.Thread(target=self._sample_stacks, name='profile-sampler', daemon=True).start()
+
+    def _sample_stacks(self):
+        while True:
+            time.sleep(STACK_INTERVAL)
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, endpoint in list(self._active.items()):
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    key = endpoint + ';' + ';'.join(reversed(stack))
+                    with self._lock:
+                        self._stacks[key] += 1
+
+    def _run_profiled(self, endpoint, fn, args, kwargs):
+        self._ensure_sampler()
+        sample = _Sample(self, endpoint)
+        sample.resume()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException:
+            sample.pause()
+            sample.finish()
+            raise
+        sample.pause()
+        if getattr(result, 'is_streamed', False):
+            # Streamed bodies (export, /ask/stream) do their work after the view returns.
+            # close() also finishes the sample: a HEAD request or a dropped client never
+            # iterates the body, and the cProfile lock must not stay held.
+            result.response = sample.wrap(result.response)
+            result.call_on_close(sample.finish)
+        else:
+            sample.finish()
+        return result
+
+    def _record(self, endpoint, profile, peak):
+        with self._lock:
+            self._samples[endpoint] += 1
+            if profile is not None:
+                try:
+                    if endpoint in self._stats:
+                        self._stats[endpoint].add(profile)
+                    else:
+                        self._stats[endpoint] = pstats.Stats(profile)
+                except TypeError:
+                    pass  # nothing was recorded
+            if peak is not None:
+                entry = self._alloc_peaks.setdefault(endpoint, [0, 0, 0])
+                entry[0] += 1
+                entry[1] += peak
+                entry[2] = max(entry[2], peak)
+            self._dirty = True
+        self._maybe_dump()
+
+    # Persisting worker data so any worker can report on all of them
+
+    def _maybe_dump(self, force=False):
+        if not self.directory:
+            return
+        now = time.monotonic()
+        if not force and (not self._dirty or now - self._last_dump < DUMP_INTERVAL):
+            return
+        self._last_dump = now
+        pid = os.getpid()
+        with self._lock:
+            self._dirty = False
+            stacks = '\n'.join(f"{stack} {count}" for stack, count in self._stacks.items())
+            stats = {endpoint: s.stats for endpoint, s in self._stats.items()}
+            allocations = {'peaks': {k: list(v) for k, v in self._alloc_peaks.items()},
+                           'samples': dict(self._samples)}
+        if tracemalloc.is_tracing():
+            allocations['top'] = self._top_allocations(limit=50)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._write(f'stacks_{pid}.txt', stacks.encode('utf-8'))
+            for endpoint, data in stats.items():
+                self._write(f'cprofile_{endpoint}_{pid}.prof', marshal.dumps(data))
+            self._write(f'alloc_{pid}.json', json.dumps(allocations).encode('utf-8'))
+        except OSError as e:
+            print(f"Could not write profile data: {str(e)}")
+
+    def _write(self, filename, data):
+        path = os.path.join(self.directory, filename)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+    def _worker_files(self, prefix):
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        own = f'_{os.getpid()}.'
+        return [os.path.join(self.directory, name) for name in sorted(os.listdir(self.directory))
+                if name.startswith(prefix) and own not in name and not name.endswith('.tmp')]
+
+    # Reports
+
+    @staticmethod
+    def _top_allocations(limit):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            # Leave out the profiler's own bookkeeping
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, pstats.__file__),
+            tracemalloc.Filter(False, linecache.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        return [
+            {'site': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+             'size_bytes': stat.size, 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:limit]
+        ]
+
+    def collapsed_stacks(self):
+        """All workers' stack samples in collapsed flamegraph format"""
+        merged = Counter()
+        with self._lock:
+            merged.update(self._stacks)
+        for path in self._worker_files('stacks_'):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    for line in f:
+                        stack, _, count = line.rstrip('\n').rpartition(' ')
+                        if stack:
+                            merged[stack] += int(count)
+            except (OSError, ValueError):
+                continue
+        return ''.join(f"{stack} {count}\n" for stack, count in merged.most_common())
+
+    def cprofile_report(self, endpoint=None, sort='cumulative', limit=40):
+        """pstats text report, merged across workers, for one endpoint or all of them"""
+        out = StringIO()
+        stats = pstats.Stats(stream=out)
+        found = False
+        with self._lock:
+            for name, own in self._stats.items():
+                if endpoint in (None, name):
+                    stats.add(own)
+                    found = True
+        for path in self._worker_files('cprofile_'):
+            name = os.path.basename(path)[len('cprofile_'):].rsplit('_', 1)[0]
+            if endpoint not in (None, name):
+                continue
+            try:
+                stats.add(path)
+                found = True
+            except (OSError, ValueError, EOFError, TypeError):
+                continue
+        if not found:
+            return "No profiled requests yet.\n"
+        stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def allocation_report(self, limit=30):
+        """Per-endpoint allocation peaks and the top allocation sites, merged across workers"""
+        with self._lock:
+            peaks = {k: list(v) for k, v in self._alloc_peaks.items()}
+            samples = Counter(self._samples)
+        top = Counter()
+        counts = Counter()
+        if tracemalloc.is_tracing():
+            for site in self._top_allocations(limit=50):
+                top[site['site']] += site['size_bytes']
+                counts[site['site']] += site['count']
+        for path in self._worker_files('alloc_'):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            samples.update(data.get('samples', {}))
+            for endpoint, (requests, total, largest) in data.get('peaks', {}).items():
+                entry = peaks.setdefault(endpoint, [0, 0, 0])
+                entry[0] += requests
+                entry[1] += total
+                entry[2] = max(entry[2], largest)
+            for site in data.get('top', []):
+                top[site['site']] += site['size_bytes']
+                counts[site['site']] += site['count']
+        return {
+            'tracemalloc': tracemalloc.is_tracing(),
+            'profiled_requests': dict(samples),
+            'peak_bytes_per_request': {
+                endpoint: {'requests': n, 'mean': round(total / n) if n else 0, 'max': largest}
+                for endpoint, (n, total, largest) in peaks.items()
+            },
+            'top_allocation_sites': [
+                {'site': site, 'size_bytes': size, 'count': counts[site]}
+                for site, size in top.most_common(limit)
+            ],
+        }
+
+    def status(self):
+        self._sync_settings(force=True)
+        with self._lock:
+            return {
+                'settings': dict(self.settings),
+                'pid': os.getpid(),
+                'profiled_requests_this_worker': dict(self._samples),
+                'shared_dir': self.directory,
+            }
+
+
+class _Sample:
+    """One profiled request; paused between chunks of a streamed response"""
+
+    def __init__(self, profiler, endpoint):
+        self.profiler = profiler
+        self.endpoint = endpoint
+        # cProfile can't nest or run in two threads at once on newer Pythons: skip it if busy
+        lock = profiler._cprofile_lock
+        self.profile = cProfile.Profile() if lock.acquire(blocking=False) else None
+        self.finished = False
+        self.baseline = None
+        if tracemalloc.is_tracing():
+            # The peak is process-wide, so concurrent requests make this an upper bound
+            tracemalloc.reset_peak()
+            self.baseline = tracemalloc.get_traced_memory()[0]
+
+    def resume(self):
+        self.thread_id = threading.get_ident()
+        self.profiler._active[self.thread_id] = self.endpoint
+        if self.profile is not None:
+            self.profile.enable()
+
+    def pause(self):
+        if self.profile is not None:
+            self.profile.disable()
+        self.profiler._active.pop(self.thread_id, None)
+
+    def finish(self):
+        """Release the cProfile lock and record the sample; only the first call counts"""
+        if self.finished:
+            return
+        self.finished = True
+        if self.profile is not None:
+            self.profiler._cprofile_lock.release()
+        peak = None
+        if self.baseline is not None and tracemalloc.is_tracing():
+            peak = max(0, tracemalloc.get_traced_memory()[1] - self.baseline)
+        self.profiler._record(self.endpoint, self.profile, peak)
+
+    def wrap(self, body):
+        try:
+            iterator = iter(body)
+            while True:
+                self.resume()
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.pause()
+                yield chunk
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+            self.finish()
+
+
+def clear_dir(path=PROFILE_DIR):
+    """Remove data and settings left by a previous run (called once when gunicorn starts)"""
+    if not path or not os.path.isdir(path):
+        return
+    for filename in os.listdir(path):
+        try:
+            os.remove(os.path.join(path, filename))
+        except OSError:
+            pass
@@ -0,0 +1,276 @@
+"""
+Rate limiting for the AI endpoints.
+
+A limiter combines a strategy (how a key's state changes on each request) with a
+backend (where that state lives). Every check is a single O(1) read-modify-write of
+one small record per client, and records expire once they are idle, so memory stays
+bounded. The SQLite and Redis backends share state between gunicorn workers.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    import redis
+except ImportError:  # Redis backend is optional
+    redis = None
+
+API_RATE_LIMIT = int(os.environ.get('API_RATE_LIMIT', 5))  # requests per day
+
+
+def _next_midnight(now):
+    midnight = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight + timedelta(days=1)).timestamp()
+
+
+class FixedWindow:
+    """`limit` requests per calendar day, resetting at local midnight.
+    State: (window_end, used)."""
+
+    name = 'fixed_window'
+
+    def __init__(self, limit):
+        self.limit = limit
+
+    def _current(self, state, now):
+        if state is None or now >= state[0]:
+            return (_next_midnight(now), 0)
+        return state
+
+    def consume(self, state, now):
+        """Return (allowed, new_state, expires_at)"""
+        window_end, used = self._current(state, now)
+        if used >= self.limit:
+            return False, (window_end, used), window_end
+        return True, (window_end, used + 1), window_end
+
+    def remaining(self, state, now):
+        return max(0, self.limit - int(self._current(state, now)[1]))
+
+    def reset_time(self, state, now):
+        return self._current(state, now)[0]
+
+
+class TokenBucket:
+    """Bucket of `limit` tokens refilled evenly over `period` seconds.
+    State: (tokens, updated_at)."""
+
+    name = 'token_bucket'
+
+    def __init__(self, limit, period=86400):
+        self.limit = limit
+        self.rate = limit / float(period)
+
+    def _current(self, state, now):
+        if state is None:
+            return float(self.limit)
+        tokens, updated_at = state
+        return min(float(self.limit), tokens + (now - updated_at) * self.rate)
+
+    def consume(self, state, now):
+        tokens = self._current(state, now)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        # Once the bucket is full again the record carries no information
+        expires_at = now + (self.limit - tokens) / self.rate
+        return allowed, (tokens, now), expires_at
+
+    def remaining(self, state, now):
+        return int(self._current(state, now))
+
+    def reset_time(self, state, now):
+        """When the next token becomes available"""
+        tokens = self._current(state, now)
+        return now if tokens >= 1 else now + (1 - tokens) / self.rate
+
+
+class MemoryBackend:
+    """Process-local state; each worker enforces its own limit"""
+
+    # Expired keys are swept at most this often (seconds)
+    SWEEP_INTERVAL = 300
+
+    def __init__(self):
+        self._data = {}  # key -> (state, expires_at)
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+
+    def _sweep(self, now):
+        if now - self._last_sweep < self.SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        for key in [k for k, (_, expires_at) in self._data.items() if expires_at <= now]:
+            del self._data[key]
+
+    def get(self, key, now):
+        with self._lock:
+            record = self._data.get(key)
+        return record[0] if record and record[1] > now else None
+
+    def update(self, key, strategy, now):
+        with self._lock:
+            self._sweep(now)
+            record = self._data.get(key)
+            state = record[0] if record and record[1] > now else None
+            allowed, state, expires_at = strategy.consume(state, now)
+            self._data[key] = (state, expires_at)
+        return allowed
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """State shared by every worker on the host through one SQLite file"""
+
+    SWEEP_INTERVAL = 300
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._last_sweep = 0
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                a REAL NOT NULL,
+                b REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS rate_limits_expiry ON rate_limits (expires_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode; transactions are opened explicitly below
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, now):
+        row = self._conn().execute(
+            "SELECT a, b FROM rate_limits WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        return tuple(row) if row else None
+
+    def update(self, key, strategy, now):
+        conn = self._conn()
+        # BEGIN IMMEDIATE takes the write lock up front so concurrent workers serialize
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT a, b FROM rate_limits WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+            allowed, state, expires_at = strategy.consume(tuple(row) if row else None, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, a, b, expires_at) VALUES (?, ?, ?, ?)",
+                (key, state[0], state[1], expires_at))
+            if now - self._last_sweep >= self.SWEEP_INTERVAL:
+                self._last_sweep = now
+                conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+
+
+class RedisBackend:
+    """State shared across hosts through Redis (or any Redis-compatible server)"""
+
+    # Compare-and-set: only write if the record is unchanged since it was read
+    _SCRIPT = """
+    local current = redis.call('HMGET', KEYS[1], 'a', 'b')
+    if (current[1] or '') ~= ARGV[1] or (current[2] or '') ~= ARGV[2] then return 0 end
+    redis.call('HSET', KEYS[1], 'a', ARGV[3], 'b', ARGV[4])
+    redis.call('EXPIREAT', KEYS[1], ARGV[5])
+    return 1
+    """
+
+    def __init__(self, url, prefix='iris:ratelimit:'):
+        if redis is None:
+            raise RuntimeError("The redis package is required for RATE_LIMIT_BACKEND=redis")
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._cas = self.client.register_script(self._SCRIPT)
+
+    def _read(self, key):
+        return self.client.hmget(self.prefix + key, 'a', 'b')
+
+    def get(self, key, now):
+        a, b = self._read(key)
+        return None if a is None else (float(a), float(b))
+
+    def update(self, key, strategy, now):
+        for _ in range(10):
+            a, b = self._read(key)
+            state = None if a is None else (float(a), float(b))
+            allowed, new_state, expires_at = strategy.consume(state, now)
+            args = [a or '', b or '', repr(new_state[0]), repr(new_state[1]), int(expires_at) + 1]
+            if self._cas(keys=[self.prefix + key], args=args):
+                return allowed
+        # Persistent contention on one key: fail closed
+        return False
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(self.prefix + '*'))
+
+
+class RateLimiter:
+    """Public interface used by the routes"""
+
+    def __init__(self, strategy, backend):
+        self.strategy = strategy
+        self.backend = backend
+
+    @property
+    def limit(self):
+        return self.strategy.limit
+
+    def hit(self, key):
+        """Record one request for key. Returns False if the key is over its limit."""
+        return self.backend.update(key, self.strategy, time.time())
+
+    def remaining(self, key):
+        now = time.time()
+        return self.strategy.remaining(self.backend.get(key, now), now)
+
+    def reset_time(self, key):
+        now = time.time()
+        return datetime.fromtimestamp(self.strategy.reset_time(self.backend.get(key, now), now))
+
+    def tracked_keys(self):
+        return len(self.backend)
+
+
+def create_rate_limiter(limit=API_RATE_LIMIT, strategy=None, backend=None):
+    """Build the limiter configured by RATE_LIMIT_STRATEGY and RATE_LIMIT_BACKEND"""
+    strategy = strategy or os.environ.get('RATE_LIMIT_STRATEGY', FixedWindow.name)
+    backend = backend or os.environ.get('RATE_LIMIT_BACKEND', 'sqlite')
+
+    if strategy == FixedWindow.name:
+        strategy = FixedWindow(limit)
+    elif strategy == TokenBucket.name:
+        strategy = TokenBucket(limit)
+    else:
+        raise ValueError(f"Unknown RATE_LIMIT_STRATEGY '{strategy}'. Use 'fixed_window' or 'token_bucket'.")
+
+    if backend == 'memory':
+        return RateLimiter(strategy, MemoryBackend())
+    if backend == 'redis':
+        return RateLimiter(strategy, RedisBackend(os.environ.get('REDIS_URL', 'redis://localhost:6379/0')))
+    if backend == 'sqlite':
+        path = os.environ.get('RATE_LIMIT_DB_PATH', 'rate_limits.db')
+        try:
+            return RateLimiter(strategy, SQLiteBackend(path))
+        except sqlite3.Error as e:
+            print(f"Could not open rate limit database {path}: {str(e)} - falling back to per-process limits")
+            return RateLimiter(strategy, MemoryBackend())
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND '{backend}'. Use 'sqlite', 'memory' or 'redis'.")
@@ -0,0 +1,250 @@
+"""
+Fits classifier engines on a labelled iris-format dataset (data/iris.csv by default).
+
+Three model families are searched:
+- threshold rules on one measurement, the kind of rule DecisionTableEngine runs
+- Gaussian class models over all four measurements (LDA/QDA, see GaussianEngine)
+- small decision trees over all four measurements
+
+Every candidate in the grid is scored with k-fold cross-validation in a process pool. The
+best one is refit on all rows and saved with iris_core/model_store.py. Run it with
+train_model.py.
+"""
+
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from iris_core.assets import ROOT
+from iris_core.classifier import COLUMN_ALIASES, FIELDS, SPECIES, DecisionTableEngine, GaussianEngine, TreeEngine
+
+DEFAULT_DATASET = os.path.join(ROOT, 'data', 'iris.csv')
+
+# Hyperparameter grids for the gaussian and tree families
+GAUSSIAN_SHRINKAGE = (0.0, 0.1, 0.5)
+TREE_DEPTHS = (1, 2, 3, 4, 5)
+TREE_MIN_LEAF = (1, 2, 4, 8)
+
+LABEL_COLUMNS = ('species', 'class', 'label', 'variety', 'target')
+
+
+def _normalize(name):
+    return ''.join(ch for ch in str(name).lower() if ch.isalnum())
+
+
+def _label_index(label):
+    name = str(label).strip().lower()
+    if name.isdigit() and int(name) < len(SPECIES):
+        return int(name)
+    for index, species in enumerate(SPECIES):
+        if species.split()[-1].lower() in name:
+            return index
+    raise ValueError(f"Unknown species label: {label!r}")
+
+
+def load_dataset(path=DEFAULT_DATASET):
+    """Read a CSV with the four measurements and a species column into (X, y)"""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = [_normalize(name) for name in next(reader, [])]
+        columns = [None] * len(FIELDS)
+        for index, name in enumerate(header):
+            field = COLUMN_ALIASES.get(name)
+            if field is not None and columns[field] is None:
+                columns[field] = index
+        label_column = next((i for i, name in enumerate(header) if name in LABEL_COLUMNS), None)
+        if None in columns or label_column is None:
+            raise ValueError(f"{path} needs sepal/petal length/width columns and a species column")
+
+        X, y = [], []
+        for line, row in enumerate(reader, start=2):
+            if not any(cell.strip() for cell in row):
+                continue
+            try:
+                X.append([float(row[i]) for i in columns])
+                y.append(_label_index(row[label_column]))
+            except (IndexError, ValueError) as e:
+                raise ValueError(f"{path} line {line}: {e}")
+    if not X:
+        raise ValueError(f"{path} has no rows")
+    return np.array(X, dtype=np.float64), np.array(y, dtype=np.intp)
+
+
+def _class_counts(y):
+    return np.bincount(y, minlength=len(SPECIES))
+
+
+# Threshold rules
+
+def fit_thresholds(X, y, feature):
+    """Best pair of cut points on one feature, with bins taken as setosa < versicolor < virginica.
+    Every pair of midpoints between observed values is scored at once from cumulative counts."""
+    values = X[:, feature]
+    unique = np.unique(values)
+    if len(unique) < 2:
+        return np.array([unique[0], unique[0]])
+    candidates = (unique[:-1] + unique[1:]) / 2
+
+    # below[c, k]: rows of species k with value <= candidate c
+    below = np.stack([(values[y == k][None, :] <= candidates[:, None]).sum(axis=1)
+                      for k in range(len(SPECIES))], axis=1)
+    total = _class_counts(y)
+    # correct(t1, t2) = setosa below t1 + versicolor between t1 and t2 + virginica above t2
+    correct = (below[:, 0][:, None]
+               + below[:, 1][None, :] - below[:, 1][:, None]
+               + total[2] - below[:, 2][None, :])
+    correct = np.where(np.triu(np.ones_like(correct, dtype=bool), k=1), correct, -1)
+    first, second = np.unravel_index(np.argmax(correct), correct.shape)
+    return np.array([candidates[first], candidates[second]])
+
+
+# Decision trees
+
+def _gini(counts):
+    totals = counts.sum(axis=-1, keepdims=True)
+    p = counts / np.maximum(totals, 1)
+    return 1 - (p * p).sum(axis=-1)
+
+
+def _best_split(X, y, min_leaf):
+    """(feature, threshold, weighted impurity) of the best split, or None"""
+    n = len(y)
+    best = None
+    onehot = np.eye(len(SPECIES), dtype=np.int64)[y]
+    for feature in range(X.shape[1]):
+        order = np.argsort(X[:, feature], kind='stable')
+        values = X[order, feature]
+        left_counts = np.cumsum(onehot[order], axis=0)[:-1]
+        right_counts = left_counts[-1] + onehot[order[-1]] - left_counts
+        left_n = np.arange(1, n)
+        # Only between distinct values, and leaving min_leaf rows on each side
+        valid = (values[1:] > values[:-1]) & (left_n >= min_leaf) & (n - left_n >= min_leaf)
+        if not valid.any():
+            continue
+        impurity = (left_n * _gini(left_counts) + (n - left_n) * _gini(right_counts)) / n
+        impurity = np.where(valid, impurity, np.inf)
+        i = int(np.argmin(impurity))
+        if best is None or impurity[i] < best[2]:
+            best = (feature, (values[i] + values[i + 1]) / 2, impurity[i])
+    return best
+
+
+def fit_tree(X, y, max_depth=3, min_samples_leaf=1):
+    """Grow a CART tree (Gini impurity) into the flat arrays TreeEngine uses"""
+    feature, threshold, left, right, counts = [], [], [], [], []
+
+    def grow(rows, depth):
+        node = len(feature)
+        feature.append(-1)
+        threshold.append(0.0)
+        left.append(node)
+        right.append(node)
+        node_counts = _class_counts(y[rows])
+        counts.append(node_counts)
+        if depth >= max_depth or np.count_nonzero(node_counts) < 2 or len(rows) < 2 * min_samples_leaf:
+            return node
+        split = _best_split(X[rows], y[rows], min_samples_leaf)
+        if split is None or split[2] >= _gini(node_counts):
+            return node
+        feature[node], threshold[node] = split[0], split[1]
+        goes_left = X[rows, split[0]] <= split[1]
+        left[node] = grow(rows[goes_left], depth + 1)
+        right[node] = grow(rows[~goes_left], depth + 1)
+        return node
+
+    grow(np.arange(len(y)), 0)
+    return TreeEngine(np.array(feature, dtype=np.intp), np.array(threshold), np.array(left, dtype=np.intp),
+                      np.array(right, dtype=np.intp), np.array(counts, dtype=np.int64))
+
+
+# Grid search
+
+def candidate_grid():
+    """Every (family, params) the search tries"""
+    grid = [('threshold', {'feature': feature}) for feature in range(len(FIELDS))]
+    grid += [('gaussian', {'shared': shared, 'shrinkage': shrinkage})
+             for shared in (True, False) for shrinkage in GAUSSIAN_SHRINKAGE]
+    grid += [('tree', {'max_depth': depth, 'min_samples_leaf': leaf})
+             for depth in TREE_DEPTHS for leaf in TREE_MIN_LEAF]
+    return grid
+
+
+def fit(family, params, X, y):
+    if family == 'threshold':
+        return DecisionTableEngine(thresholds=fit_thresholds(X, y, params['feature']), feature=params['feature'])
+    if family == 'gaussian':
+        return GaussianEngine.fit(X, y, **params)
+    return fit_tree(X, y, **params)
+
+
+def _folds(n, k, seed):
+    order = np.random.default_rng(seed).permutation(n)
+    return np.array_split(order, k)
+
+
+# Set in each pool process by _init_worker, so the dataset is sent once rather than per task
+_worker_data = None
+
+
+def _init_worker(X, y, folds):
+    global _worker_data
+    _worker_data = (X, y, folds)
+
+
+def _cross_validate(candidate):
+    family, params = candidate
+    X, y, folds = _worker_data
+    scores = []
+    for test in folds:
+        train = np.setdiff1d(np.arange(len(y)), test, assume_unique=True)
+        engine = fit(family, params, X[train], y[train])
+        scores.append(float((engine.predict_array(X[test])[0] == y[test]).mean()))
+    return family, params, float(np.mean(scores))
+
+
+def _complexity(result):
+    # Ties go to the simpler model: a threshold rule, then a shared covariance, then shallower
+    # trees with bigger leaves
+    family, params, _ = result
+    if family == 'threshold':
+        return (0, 0, 0)
+    if family == 'gaussian':
+        return (1, 0 if params['shared'] else 1, -params['shrinkage'])
+    return (2, params['max_depth'], -params['min_samples_leaf'])
+
+
+def search(X, y, folds=5, jobs=None, seed=0):
+    """Cross-validate the whole grid with `folds` folds (2 or more), in parallel over jobs
+    processes (1: in this process). Returns [(family, params, accuracy)], best first."""
+    fold_indices = _folds(len(y), folds, seed)
+    grid = candidate_grid()
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        _init_worker(X, y, fold_indices)
+        results = [_cross_validate(candidate) for candidate in grid]
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(grid)), initializer=_init_worker,
+                                 initargs=(X, y, fold_indices)) as pool:
+            results = list(pool.map(_cross_validate, grid))
+    return sorted(results, key=lambda r: (-round(r[2], 9), _complexity(r)))
+
+
+def train(path=DEFAULT_DATASET, folds=5, jobs=None, seed=0):
+    """Search the grid on a dataset and refit the winner on every row.
+    Returns (engine, metadata for the artifact, ranked search results)."""
+    X, y = load_dataset(path)
+    folds = max(2, min(folds, len(y)))
+    results = search(X, y, folds=folds, jobs=jobs, seed=seed)
+    family, params, accuracy = results[0]
+    engine = fit(family, params, X, y)
+    metadata = {
+        'params': params,
+        'cv_accuracy': round(accuracy, 4),
+        'train_accuracy': round(float((engine.predict_array(X)[0] == y).mean()), 4),
+        'folds': folds,
+        'rows': int(len(y)),
+        'dataset': os.path.basename(path),
+    }
+    return engine, metadata, results
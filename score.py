@@ -0,0 +1,58 @@
+"""
+Command line bulk scoring for large CSV / NDJSON files.
+Reads the input in chunks and writes results as it goes, so it works on files of any size.
+Scores with the same model the app serves: the live version in MODEL_DIR when there is one.
+
+Usage:
+    python score.py survey.csv -o scores.csv
+    cat survey.ndjson | python score.py - --input ndjson > scores.ndjson
+    python score.py survey.csv --engine decision_table
+"""
+
+import argparse
+import contextlib
+import sys
+
+from iris_core import bulk, model_store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify iris measurements from a CSV or NDJSON file")
+    parser.add_argument('path', help="input file, or - for stdin")
+    parser.add_argument('-o', '--output-file', help="where to write results (default: stdout)")
+    parser.add_argument('--input', choices=bulk.FORMATS, help="input format (default: guessed from the file name)")
+    parser.add_argument('--output', choices=bulk.FORMATS, help="output format (default: same as input)")
+    parser.add_argument('--chunk-size', type=int, default=bulk.CHUNK_SIZE, help="rows classified per pass")
+    parser.add_argument('--probabilities', action='store_true', help="add each species' posterior probability")
+    parser.add_argument('--engine', help="classifier engine (default: as the app - the trained model, else CLASSIFIER_ENGINE)")
+    parser.add_argument('--model-dir', default=model_store.MODEL_DIR, help="where trained models live (default: MODEL_DIR)")
+    args = parser.parse_args(argv)
+
+    src = dst = None
+    try:
+        input_format = args.input or bulk.detect_format(args.path)
+        output_format = args.output or input_format
+        src = sys.stdin if args.path == '-' else open(args.path, newline='', encoding='utf-8')
+        dst = sys.stdout if not args.output_file else open(args.output_file, 'w', newline='', encoding='utf-8')
+
+        # Load MODEL_DIR/CURRENT as the app's workers do, so the default engine is the one they serve.
+        # Its log lines go to stderr, since stdout may be the scored file.
+        with contextlib.redirect_stdout(sys.stderr):
+            model_store.ModelWatcher(args.model_dir, interval=0).check()
+        records = bulk.open_records(src, input_format)
+        for block in bulk.score_records(records, output_format, max(1, args.chunk_size), engine=args.engine,
+                                        probabilities=args.probabilities):
+            dst.write(block)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if src is not None and src is not sys.stdin:
+            src.close()
+        if dst is not None and dst is not sys.stdout:
+            dst.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+import pytest
+
+from iris_core import gemini
+from iris_core.factory import create_app
+from iris_core.rate_limit import create_rate_limiter
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """The app with in-memory history and rate limits, and no Gemini startup probe"""
+    monkeypatch.setenv('HISTORY_BACKEND', 'memory')
+    monkeypatch.setenv('RATE_LIMIT_BACKEND', 'memory')
+    monkeypatch.delenv('ASK_CACHE_PATH', raising=False)
+    monkeypatch.setattr(gemini.LazyModel, 'start', lambda self, mode=None: self)
+    app = create_app()
+    app.extensions['iris'].rate_limiter = create_rate_limiter(limit=5, backend='memory')
+    return app
@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+from iris_core.rate_limit import create_rate_limiter
+
+
+class Answer:
+    text = 'Setosa has the shortest petals.'
+
+
+class BlockingModel:
+    """Stands in for Gemini; every call waits until release is set"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def generate_content(self, *args, **kwargs):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return Answer()
+
+
+@pytest.fixture
+def services(app):
+    services = app.extensions['iris']
+    services.model._model = BlockingModel()
+    services.client = app.test_client
+    return services
+
+
+def test_only_the_half_open_probe_is_charged(services):
+    breaker = services.llm_pool.breaker
+    with breaker._lock:
+        breaker._open("test")
+    breaker.opened_at -= breaker.cooldown + 1  # the cooldown is over: the next call is the probe
+    model = services.model._model
+
+    results = {}
+    probe = threading.Thread(target=lambda: results.update(
+        probe=services.client().post('/ask', json={'question': 'Which species has the shortest petals?'})))
+    probe.start()
+    assert model.started.wait(5)
+    assert breaker.state == 'half_open'
+
+    # While the probe is out, other new questions are answered offline, free of charge
+    client = services.client()
+    offline = client.post('/ask', json={'question': 'How wide are virginica sepals?'})
+    assert offline.status_code == 200 and 'pre-defined response' in offline.get_json()['answer']
+    streamed = client.post('/ask/stream', json={'question': 'What is a petal?'}).get_data(as_text=True)
+    assert '"fallback": true' in streamed
+
+    model.release.set()
+    probe.join(5)
+    assert results['probe'].get_json()['answer'] == Answer.text
+    assert model.calls == 1
+    assert breaker.state == 'closed'
+    assert services.get_remaining_requests('127.0.0.1') == 4
+
+
+def test_rate_limited_caller_gives_the_probe_back(services):
+    breaker = services.llm_pool.breaker
+    services.rate_limiter = create_rate_limiter(limit=0, backend='memory')
+    with breaker._lock:
+        breaker._open("test")
+    breaker.opened_at -= breaker.cooldown + 1
+    services.model._model.release.set()
+
+    client = services.client()
+    assert client.post('/ask', json={'question': 'Why are irises purple?'}).status_code == 429
+    assert client.post('/ask/stream', json={'question': 'Why are irises blue?'}).status_code == 429
+
+    # The permission each rejected request reserved went back, so a paying caller can still probe
+    services.rate_limiter = create_rate_limiter(limit=1, backend='memory')
+    response = client.post('/ask', json={'question': 'Why are irises purple?'})
+    assert response.get_json()['answer'] == Answer.text
+    assert breaker.state == 'closed'
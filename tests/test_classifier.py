@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from iris_core import bulk
+from iris_core.classifier import MAX_MEASUREMENT, get_engine, predict_rows, posterior_confidence
+
+
+def test_batch_confidence_is_the_posterior_of_the_predicted_species():
+    rows = [[5.1, 3.5, 1.4, 0.2], [6.0, 2.7, 5.1, 1.6], [6.3, 2.9, 5.6, 1.8]]
+    X = np.array(rows)
+    indices, _ = get_engine().predict_array(X)
+    expected = posterior_confidence(X, indices).tolist()
+
+    assert [p['confidence'] for p in predict_rows(rows)] == expected
+    lines = ''.join(bulk.score_records(rows)).splitlines()
+    assert [float(line.split(',')[6]) for line in lines[1:]] == expected
+
+
+def test_posteriors_stay_finite_for_extreme_measurements():
+    proba = get_engine('gaussian').predict_proba(np.array([[5, 3, 1e200, 1], [-1e300, 0, 0, 0]]))
+    assert np.isfinite(proba).all()
+    assert np.allclose(proba.sum(axis=1), 1)
+
+
+@pytest.mark.parametrize('value', [1e308, -2 * MAX_MEASUREMENT, float('inf')])
+def test_out_of_range_measurements_are_rejected_by_every_route(app, value):
+    with pytest.raises(ValueError):
+        predict_rows([[5, 3, value, 1]])
+    lines = ''.join(bulk.score_records([[5, 3, value, 1], [5.1, 3.5, 1.4, 0.2]])).splitlines()
+    assert lines[1].endswith('Invalid measurements') and 'Iris Setosa' in lines[2]
+
+    page = app.test_client().post('/', data={'sl': 5, 'sw': 3, 'pl': value, 'pw': 1}).get_data(as_text=True)
+    assert 'Error: Measurements must be' in page and '33.3' not in page
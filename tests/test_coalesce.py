@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+from iris_core.coalesce import CallRejected, SingleFlight
+
+
+def test_only_callers_that_start_a_call_are_admitted():
+    flights = SingleFlight()
+    admitted = []
+    calls = []
+    release = threading.Event()
+
+    def slow_call():
+        calls.append(1)
+        release.wait(5)
+        return 'answer'
+
+    def admit():
+        admitted.append(1)
+        return True
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do('q', slow_call, admit=admit)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == len(admitted) == 1
+    assert sorted(shared for _, shared in results) == [False] + [True] * 7
+
+    # Once the call is over, the next caller starts (and pays for) a new one
+    assert flights.do('q', lambda: 'again', admit=admit) == ('again', False)
+    assert len(admitted) == 2
+
+
+def test_rejected_caller_leaves_no_call_behind():
+    flights = SingleFlight()
+    with pytest.raises(CallRejected):
+        flights.do('q', lambda: 'answer', admit=lambda: False)
+    assert not flights.in_flight('q')
+    assert flights.do('q', lambda: 'answer', admit=lambda: True) == ('answer', False)
+
+
+def test_finish_is_idempotent():
+    flights = SingleFlight()
+    flight, role = flights.begin('q')
+    assert role == 'leader'
+    flights.finish(flight, result='first')
+    flights.finish(flight, error=RuntimeError('late'))
+    assert flights.wait(flight, 'follower') == 'first'
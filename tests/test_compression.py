@@ -0,0 +1,46 @@
+import gzip
+
+import pytest
+
+from iris_core.compression import CompressionMiddleware
+
+LINES = [b'{"row": %d, "species": "Iris Setosa"}\n' % i for i in range(200)]
+
+
+def _run(app, accept='gzip'):
+    captured = {}
+
+    def start_response(status, headers, exc_info=None):
+        captured['status'], captured['headers'] = status, dict(headers)
+
+    environ = {'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': accept}
+    body = b''.join(CompressionMiddleware(app)(environ, start_response))
+    return captured['headers'], body
+
+
+@pytest.mark.parametrize('content_type', ['application/jsonl', 'application/x-ndjson',
+                                          'application/ndjson; charset=utf-8'])
+def test_ndjson_streams_are_compressed(content_type):
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', content_type)])
+        return iter(LINES)  # streamed: no Content-Length
+
+    headers, body = _run(app)
+    assert headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in headers['Vary']
+    assert gzip.decompress(body) == b''.join(LINES)
+
+
+def test_binary_and_small_bodies_are_left_alone():
+    def app(environ, start_response):
+        body = environ['body']
+        start_response('200 OK', [('Content-Type', environ['type']), ('Content-Length', str(len(body)))])
+        return [body]
+
+    for content_type, body in (('application/vnd.apache.parquet', b''.join(LINES)), ('application/jsonl', LINES[0])):
+        def wrapped(environ, start_response, content_type=content_type, body=body):
+            return app(dict(environ, type=content_type, body=body), start_response)
+
+        headers, result = _run(wrapped)
+        assert 'Content-Encoding' not in headers
+        assert result == body
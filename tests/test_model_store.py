@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from iris_core import model_store
+from iris_core.classifier import DecisionTableEngine, GaussianEngine
+from iris_core.training import fit_tree, load_dataset
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_save_and_load_round_trip(tmp_path):
+    X, y = load_dataset()
+    for engine in (fit_tree(X, y, max_depth=3), GaussianEngine.fit(X, y), DecisionTableEngine()):
+        version = model_store.save_model(engine, {'params': {'note': 'test'}}, model_dir=str(tmp_path))
+        assert model_store.current_version(str(tmp_path)) == version
+
+        loaded = model_store.load_version(version, str(tmp_path))
+        assert loaded.name == model_store.ENGINE_NAME and loaded.version == version
+        assert loaded.info['params']['note'] == 'test'
+        expected, loaded_result = engine.predict_array(X), loaded.predict_array(X)
+        assert (loaded_result[0] == expected[0]).all()
+        assert np.allclose(loaded_result[1], expected[1])
+
+
+def test_prune_keeps_the_live_version(tmp_path):
+    model_dir = str(tmp_path)
+    for thresholds in ([2.0, 4.5], [2.5, 4.8], [2.45, 4.75]):
+        model_store.save_model(DecisionTableEngine(thresholds=np.array(thresholds)), model_dir=model_dir)
+    versions = model_store.list_versions(model_dir)
+    assert len(versions) == 3
+    model_store.activate_version(versions[0], model_dir)  # rolled back to the oldest
+
+    assert model_store.prune_versions(keep=1, model_dir=model_dir) == [versions[1]]
+    assert model_store.list_versions(model_dir) == [versions[0], versions[2]]
+    assert model_store.load_version(versions[0], model_dir).version == versions[0]
+
+
+def test_trained_engine_setting_is_accepted_before_a_model_loads(tmp_path):
+    env = dict(os.environ, CLASSIFIER_ENGINE='trained', MODEL_DIR=str(tmp_path))
+    code = 'from iris_core.classifier import get_engine; print(get_engine().name)'
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert 'WARNING' not in result.stdout
+    assert result.stdout.strip().splitlines()[-1] == 'decision_table'
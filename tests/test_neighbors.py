@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from iris_core.neighbors import KDTree, MAX_MEASUREMENT, nearest_flowers, reference_set
+
+
+def brute_force(points, X, k):
+    with np.errstate(over='ignore'):
+        distances = np.sqrt(((X[:, None, :] - points[None, :, :]) ** 2).sum(axis=2))
+    return np.sort(distances, axis=1)[:, :k]
+
+
+@pytest.mark.parametrize('k', [1, 5, 200])
+def test_query_matches_brute_force(k):
+    rng = np.random.default_rng(0)
+    points = rng.normal(size=(150, 4))
+    points[1::7] = points[::7][:len(points[1::7])]  # duplicates
+    tree = KDTree(points)
+    X = rng.normal(size=(300, 4))
+    expected = brute_force(points, X, min(k, len(points)))
+
+    distances, indices = tree.query(X, k)
+    assert np.allclose(distances, expected)
+    assert (indices >= 0).all()
+    for i in range(0, len(X), 10):  # single rows take the plain-Python path
+        one_distances, one_indices = tree.query(X[i:i + 1], k)
+        assert np.allclose(one_distances[0], expected[i])
+        assert np.allclose(np.linalg.norm(points[one_indices[0]] - X[i], axis=1), one_distances[0])
+
+
+@pytest.mark.parametrize('value', [1e200, -1e200, 1e308, 0.0, -3.5])
+def test_extreme_inputs_still_return_real_flowers(value):
+    tree = reference_set.tree
+    X = np.array([[5.0, 3.0, value, 1.0], [value] * 4])
+    expected = brute_force(reference_set.X, X, 3)
+    for rows, want in ((X, expected), (X[:1], expected[:1]), (X[1:], expected[1:])):
+        distances, indices = tree.query(rows, 3)
+        assert (indices >= 0).all()
+        assert all(len(set(row)) == 3 for row in indices.tolist())
+        finite = np.isfinite(want)
+        assert np.allclose(distances[finite], want[finite])
+        assert (np.isfinite(distances) == finite).all()
+
+
+def test_nearest_flowers():
+    nearest = nearest_flowers([[5.1, 3.5, 1.4, 0.2]], 3)[0]
+    assert nearest[0]['row'] == 1 and nearest[0]['distance'] == 0.0
+    assert [flower['species'] for flower in nearest] == ['Iris Setosa'] * 3
+    assert [flower['distance'] for flower in nearest] == sorted(flower['distance'] for flower in nearest)
+
+
+@pytest.mark.parametrize('row', [[5, 3, 1e200, 1], [5, 3, float('inf'), 1], [5, 3, float('nan'), 1],
+                                 [MAX_MEASUREMENT * 2, 3, 1, 1]])
+def test_nearest_flowers_rejects_unusable_measurements(row):
+    with pytest.raises(ValueError):
+        nearest_flowers([row], 3)
+
+
+def test_nearest_flowers_rejects_bad_k():
+    with pytest.raises(ValueError):
+        nearest_flowers([[5, 3, 1, 1]], 0)
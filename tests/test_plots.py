@@ -0,0 +1,85 @@
+import struct
+import zlib
+
+import html
+import re
+
+import numpy as np
+import pytest
+
+from iris_core import classifier
+from iris_core.plots import PALETTE, PLOT_FORMAT, PlotRenderer, encode_png
+
+
+def decode_png(data):
+    """(palette indices, palette) from an 8-bit indexed PNG with unfiltered rows"""
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    chunks, position = {}, 8
+    while position < len(data):
+        length, tag = struct.unpack('>I4s', data[position:position + 8])
+        body = data[position + 8:position + 8 + length]
+        crc, = struct.unpack('>I', data[position + 8 + length:position + 12 + length])
+        assert crc == zlib.crc32(tag + body) & 0xffffffff
+        chunks[tag] = chunks.get(tag, b'') + body
+        position += 12 + length
+    width, height, depth, color_type, _, _, _ = struct.unpack('>IIBBBBB', chunks[b'IHDR'])
+    assert (depth, color_type) == (8, 3)
+    raw = np.frombuffer(zlib.decompress(chunks[b'IDAT']), dtype=np.uint8).reshape(height, width + 1)
+    assert (raw[:, 0] == 0).all()
+    return raw[:, 1:], np.frombuffer(chunks[b'PLTE'], dtype=np.uint8).reshape(-1, 3)
+
+
+def test_encode_png_round_trips():
+    image = np.random.default_rng(0).integers(0, len(PALETTE), size=(7, 13)).astype(np.uint8)
+    pixels, palette = decode_png(encode_png(image))
+    assert (pixels == image).all()
+    assert (palette == PALETTE).all()
+
+
+def test_rendered_plots_decode_and_are_cached():
+    renderer = PlotRenderer(max_entries=2)
+    png, etag = renderer.render('png', 4.72, 1.21)
+    pixels, _ = decode_png(png)
+    assert pixels.shape == (320, 480)
+    assert etag.endswith('-png-4.70-1.20')
+    assert renderer.render('png', 4.7, 1.2) == (png, etag)  # same bucket
+    assert renderer.hits == 1
+
+    svg, _ = renderer.render('svg', 1.4, 0.2)
+    assert svg.startswith(b'<svg') and svg.endswith(b'</svg>')
+    renderer.render('png', 6.0, 2.0)
+    assert len(renderer) == 2
+
+
+@pytest.mark.parametrize('value', [float('inf'), float('nan')])
+def test_quantize_rejects_non_finite(value):
+    with pytest.raises(ValueError):
+        PlotRenderer().quantize(value)
+
+
+def test_quantize_clamps_huge_values():
+    renderer = PlotRenderer()
+    assert renderer.quantize(1e308) == renderer.quantize(1e6)
+    decode_png(renderer.render('png', 1e308, -1e308)[0])
+
+
+@pytest.mark.skipif(PLOT_FORMAT == 'off', reason="plots are turned off")
+def test_plot_urls_change_when_the_engine_does(app, monkeypatch):
+    client = app.test_client()
+
+    def plot_url():
+        page = client.post('/', data={'sl': 5.9, 'sw': 3.0, 'pl': 4.8, 'pw': 1.7}).get_data(as_text=True)
+        return html.unescape(re.search(r'src="(/plot\.[a-z]+\?[^"]+)"', page).group(1))
+
+    first = plot_url()
+    response = client.get(first)
+    assert response.status_code == 200 and response.headers['Cache-Control'] == 'public, max-age=3600'
+
+    monkeypatch.setattr(classifier, '_default_engine', 'gaussian')  # as a model reload would
+    second = plot_url()
+    assert second != first
+    assert client.get(second).headers['Cache-Control'] == 'public, max-age=3600'
+    # An old page's URL now shows the new regions, and must not be kept
+    stale = client.get(first)
+    assert stale.headers['Cache-Control'] == 'no-cache'
+    assert stale.headers['ETag'] == client.get(second).headers['ETag']
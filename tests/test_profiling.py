@@ -0,0 +1,27 @@
+from flask import Flask, Response
+
+from iris_core.profiling import Profiler
+
+
+def make_app(profiler):
+    app = Flask(__name__)
+
+    @app.route('/stream')
+    @profiler.profile('stream')
+    def stream():
+        return Response((str(i) for i in range(3)), mimetype='text/plain')
+
+    return app
+
+
+def test_streamed_response_releases_the_cprofile_lock_when_not_iterated():
+    profiler = Profiler(directory=None, sample_rate=1.0)
+    client = make_app(profiler).test_client()
+
+    response = client.head('/stream')
+    assert response.status_code == 200
+    response.close()  # as a WSGI server does once the (empty) HEAD body has been sent
+    assert not profiler._cprofile_lock.locked()
+    assert client.get('/stream').get_data(as_text=True) == '012'
+    assert not profiler._cprofile_lock.locked()
+    assert profiler.status()['profiled_requests_this_worker'] == {'stream': 2}
@@ -0,0 +1,17 @@
+import score
+
+
+def test_scores_a_csv_file(tmp_path):
+    source, target = tmp_path / 'in.csv', tmp_path / 'out.csv'
+    source.write_text('sl,sw,pl,pw\n5.1,3.5,1.4,0.2\n')
+    assert score.main([str(source), '-o', str(target), '--model-dir', str(tmp_path / 'models')]) == 0
+    assert target.read_text().splitlines()[1].startswith('1,5.1,3.5,1.4,0.2,Iris Setosa,')
+
+
+def test_unopenable_files_are_reported(tmp_path, capsys):
+    source = tmp_path / 'in.csv'
+    source.write_text('5.1,3.5,1.4,0.2\n')
+    assert score.main([str(tmp_path / 'missing.csv')]) == 1
+    assert capsys.readouterr().err.startswith('Error: ')
+    assert score.main([str(source), '-o', str(tmp_path / 'no-such-dir' / 'out.csv')]) == 1
+    assert capsys.readouterr().err.startswith('Error: ')
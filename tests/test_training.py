@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from iris_core.training import fit_thresholds, fit_tree, load_dataset
+
+
+@pytest.fixture(scope='module')
+def iris():
+    return load_dataset()
+
+
+def test_petal_thresholds_separate_the_species(iris):
+    X, y = iris
+    low, high = fit_thresholds(X, y, feature=2)
+    assert 1.9 <= low <= 3.0 and 4.5 <= high <= 5.1
+    predicted = np.searchsorted([low, high], X[:, 2], side='left')
+    assert (predicted == y).mean() >= 0.94
+
+
+@pytest.mark.parametrize('max_depth, accuracy', [(1, 0.66), (2, 0.95), (4, 0.99)])
+def test_tree_training_accuracy_grows_with_depth(iris, max_depth, accuracy):
+    X, y = iris
+    engine = fit_tree(X, y, max_depth=max_depth)
+    indices, _ = engine.predict_array(X)
+    assert (indices == y).mean() >= accuracy
+
+
+def test_tree_respects_min_samples_leaf(iris):
+    X, y = iris
+    engine = fit_tree(X, y, max_depth=10, min_samples_leaf=10)
+    leaves = engine.feature < 0
+    assert leaves.any() and (engine.counts[leaves].sum(axis=1) >= 10).all()
@@ -0,0 +1,68 @@
+"""
+Train a classifier on a labelled iris dataset and publish it to MODEL_DIR (see
+iris_core/training.py and iris_core/model_store.py). Running workers pick the new model up
+within MODEL_RELOAD_INTERVAL seconds, without a restart.
+
+Usage:
+    python train_model.py                          # data/iris.csv, all CPUs
+    python train_model.py survey.csv --jobs 4 --folds 10
+    python train_model.py --no-activate            # save it, but leave the live model alone
+    python train_model.py --activate 20261018T120000-1a2b3c4d   # roll back or forward
+"""
+
+import argparse
+import sys
+
+from iris_core import model_store, training
+from iris_core.classifier import FIELDS
+
+
+def describe(family, params):
+    if family == 'threshold':
+        return f"threshold rule on {FIELDS[params['feature']]}"
+    if family == 'gaussian':
+        return f"gaussian, {'shared' if params['shared'] else 'per-species'} covariance, shrinkage {params['shrinkage']}"
+    return f"tree, depth {params['max_depth']}, min leaf {params['min_samples_leaf']}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train and publish an iris classifier")
+    parser.add_argument('path', nargs='?', default=training.DEFAULT_DATASET, help="labelled CSV (default: data/iris.csv)")
+    parser.add_argument('--model-dir', default=model_store.MODEL_DIR, help="where versions are kept")
+    parser.add_argument('--folds', type=int, default=5, help="cross-validation folds")
+    parser.add_argument('--jobs', type=int, default=None, help="processes for the grid search (default: CPU count)")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the fold shuffle")
+    parser.add_argument('--keep', type=int, default=5, help="versions to keep on disk")
+    parser.add_argument('--no-activate', action='store_true', help="don't make the new model live")
+    parser.add_argument('--activate', metavar='VERSION', help="make an existing version live and exit")
+    args = parser.parse_args(argv)
+
+    if args.activate:
+        try:
+            model_store.activate_version(args.activate, args.model_dir)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        print(f"{args.activate} is now live")
+        return 0
+
+    try:
+        engine, metadata, results = training.train(args.path, folds=args.folds, jobs=args.jobs, seed=args.seed)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print(f"{len(results)} candidates, {metadata['folds']}-fold cross-validation on {metadata['rows']} rows:")
+    for family, params, accuracy in results[:5]:
+        print(f"  {accuracy:.4f}  {describe(family, params)}")
+
+    version = model_store.save_model(engine, metadata, args.model_dir, activate=not args.no_activate)
+    for removed in model_store.prune_versions(args.keep, args.model_dir):
+        print(f"Removed old version {removed}")
+    print(f"Saved {version}: {describe(*results[0][:2])}, "
+          f"cv accuracy {metadata['cv_accuracy']:.4f}" + ("" if args.no_activate else " (live)"))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())